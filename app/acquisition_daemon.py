@@ -0,0 +1,162 @@
+import argparse, json, os, signal, socketserver, threading, time
+from typing import Dict, Optional
+
+from process_manager import ProcessManager
+from serial_reader import SerialReader
+
+# Headless acquisition: owns the serial port, appends to the log and the run file, and serves the
+# log to any number of local clients over a Unix socket. Runs keep going when the GUI is closed.
+# Usage: python3 app/acquisition_daemon.py [--log data/data.txt] [--socket data/acquisition.sock] [--start]
+#
+# Requests and answers are single JSON lines, errors are answered with {"error": "..."}:
+#   {"cmd": "status"}                       -> {"running", "generation", "log_end", "reader_error"}
+#   {"cmd": "read", "offset": n}            -> {"generation", "log_end", "data"}, log bytes from offset as latin-1
+#   {"cmd": "start"} / {"cmd": "stop"}      -> {"running"}
+#   {"cmd": "set", "values": {name: value}, "timeout": s} -> {"response"}, see ProcessManager.set_parameters
+#   {"cmd": "clear"}                        -> {"generation"}
+# generation changes when the log is cleared or the daemon restarts, offsets of an older generation are meaningless
+
+
+class AcquisitionDaemon:
+    # Newest log bytes are kept in memory, older ones are read from the log, which is flushed long before
+    tail_size:     int   = 1024 * 1024
+    read_limit:    int   = 4 * 1024 * 1024
+    pump_interval: float = 0.1
+
+    def __init__(self, log_file_path: str, socket_path: str):
+        self.log_file_path: str              = log_file_path
+        self.socket_path:   str              = socket_path
+        self.lock:          threading.Lock   = threading.Lock()
+        self.stop_event:    threading.Event  = threading.Event()
+        # Starts from the clock, so clients of a restarted daemon read its log again
+        self.generation:    int              = time.time_ns()
+        self.reader:        Optional[SerialReader] = None
+        self.reader_error:  Optional[str]    = None
+
+        # Log offset right after the last line taken from the reader, and the bytes before it
+        self.log_end:    int       = os.path.getsize(log_file_path) if os.path.exists(log_file_path) else 0
+        self.tail:       bytearray = bytearray()
+        self.tail_start: int       = self.log_end
+
+        def on_reader_exit(error):
+            self.reader_error = str(error) if error is not None else None
+        ProcessManager.add_exit_callback(on_reader_exit)
+
+    # ========== Serial ==========
+    def pump(self):
+        # Moves framed lines from the serial reader into the tail
+        while not self.stop_event.wait(self.pump_interval):
+            reader = ProcessManager.serial_reader
+            if reader is None:
+                continue
+            with self.lock:
+                if reader is not self.reader:
+                    # New reader, it appends after what was in the log when it started
+                    self.reader = reader
+                    self.log_end = self.tail_start = reader.start_offset
+                    self.tail.clear()
+                data: bytes = b''.join(reader.get_lines())
+                if data:
+                    self.tail += data
+                    self.log_end += len(data)
+                    if len(self.tail) > self.tail_size:
+                        drop: int = len(self.tail) - self.tail_size
+                        del self.tail[:drop]
+                        self.tail_start += drop
+
+    def read(self, offset: int) -> bytes:
+        with self.lock:
+            if offset >= self.tail_start:
+                return bytes(self.tail[offset - self.tail_start:offset - self.tail_start + self.read_limit])
+            end: int = min(self.tail_start, offset + self.read_limit)
+        with open(self.log_file_path, 'rb') as file:
+            file.seek(offset)
+            return file.read(end - offset)
+
+    def clear(self):
+        with self.lock:
+            ProcessManager.clear_data(self.log_file_path)
+            self.generation += 1
+            self.tail.clear()
+            self.log_end = self.tail_start = 0
+
+    # ========== Clients ==========
+    def handle(self, request: Dict) -> Dict:
+        command: str = request.get('cmd', '')
+        if command == 'status':
+            return {'running': ProcessManager.is_process_running(), 'generation': self.generation,
+                    'log_end': self.log_end, 'reader_error': self.reader_error}
+        if command == 'read':
+            data: bytes = self.read(int(request['offset']))
+            return {'generation': self.generation, 'log_end': self.log_end, 'data': data.decode('latin-1')}
+        if command == 'start':
+            self.reader_error = None
+            ProcessManager.start_process(self.log_file_path)
+            return {'running': ProcessManager.is_process_running()}
+        if command == 'stop':
+            ProcessManager.stop_process()
+            return {'running': ProcessManager.is_process_running()}
+        if command == 'set':
+            return {'response': ProcessManager.set_parameters(request['values'], float(request.get('timeout', 2.0)))}
+        if command == 'clear':
+            self.clear()
+            return {'generation': self.generation}
+        raise ValueError("Unknown command \"{}\"".format(command))
+
+    def serve(self):
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        response: Dict = daemon.handle(json.loads(line))
+                    except Exception as error:
+                        response = {'error': str(error)}
+                    try:
+                        self.wfile.write(json.dumps(response).encode() + b'\n')
+                        self.wfile.flush()
+                    except OSError:
+                        # Client gave up waiting and reconnects, the answer has nobody to go to
+                        return
+
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        server.daemon_threads = True
+        pump = threading.Thread(target=self.pump, name='DaemonPump', daemon=True)
+        pump.start()
+
+        def shutdown(signum, frame):
+            # shutdown() waits for serve_forever, which runs on this thread
+            threading.Thread(target=server.shutdown).start()
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        print(f"Serving \"{self.log_file_path}\" on \"{self.socket_path}\"")
+        try:
+            server.serve_forever()
+        finally:
+            self.stop_event.set()
+            ProcessManager.stop_process()
+            server.server_close()
+            os.remove(self.socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serial acquisition daemon")
+    parser.add_argument('--log', default='data/data.txt', help="Log file the samples are appended to")
+    parser.add_argument('--socket', default='data/acquisition.sock')
+    parser.add_argument('--port', default=SerialReader.default_port)
+    parser.add_argument('--start', action='store_true', help="Open the serial port right away")
+    args = parser.parse_args()
+
+    SerialReader.default_port = args.port
+    daemon = AcquisitionDaemon(args.log, args.socket)
+    if args.start:
+        ProcessManager.start_process(args.log)
+    daemon.serve()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,48 +1,51 @@
-from typing import Dict
+import queue, threading, time
+startup_start_ns: int = time.perf_counter_ns()
+
+from typing import Dict, Optional
 import numpy as np
 import customtkinter as ctk
-import matplotlib.style as mplstyle
-import matplotlib.animation as mpl_animation
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
 from CTkMessagebox import CTkMessagebox
 
-from file_manager import FileParser,FileManager
+from file_manager import FileManager, ParameterAutosaver
 from process_manager import ProcessManager
 from my_timer import Timer
+from decimation import point_budget
+from data_pipeline import DataPipeline, GraphSnapshot
+from run_archive import RunArchive
+
+
+def import_plotting():
+    # matplotlib takes most of the startup time, it is imported on a thread while the window is
+    # already up. The imports in setup_graph then only look the modules up
+    import matplotlib.style, matplotlib.animation, matplotlib.figure
+    import matplotlib.backends.backend_tkagg
 
 class Application(ctk.CTk):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        mplstyle.use('fast')
- 
         # Global variables
-        self.data_file_path   = 'data/data.txt'
         self.header_file_path = 'sketch/parameters.h'
+        self.setup_data('data/data.txt')
 
-        # Initialize attributes
-        self.control_buttons: Dict[str, ctk.CTkButton] = {}
-        self.parameters_entries: Dict[str, Dict[str, ctk.CTkEntry]] = {'Substrate': {}, 'Source': {}, 'Additional': {}, 'Savenames': {}}
-        self.info_labels = {}
-
-        self.last_substrate_temp: float = 0
-        self.last_source_temp: float = 0
+        # The GUI is a client of the acquisition daemon if it runs, otherwise it reads the port itself
+        ProcessManager.connect_daemon('data/acquisition.sock')
 
         # Configure the window
         self.geometry("1600x900")
         self.title("Hohol production")
 
-        self.fig = Figure(figsize=(5, 4), dpi=100)
-        self.ax = self.fig.add_subplot(111)
-        self.update_graph(None)
-
-        self.canvas = FigureCanvasTkAgg(self.fig, master=self)
-        self.canvas.draw()
-        self.canvas.get_tk_widget().pack(side=ctk.TOP, fill=ctk.BOTH, expand=True)
+        # The pipeline thread loads the data file while matplotlib is imported
+        self.pipeline.start()
+        plotting_import = threading.Thread(target=import_plotting, name='PlottingImport', daemon=True)
+        plotting_import.start()
 
-        self.ani = mpl_animation.FuncAnimation(self.fig, self.update_graph, interval=920)
+        # The plot goes here once matplotlib is loaded
+        self.plot_frame = ctk.CTkFrame(self)
+        self.plot_frame.pack(side=ctk.TOP, fill=ctk.BOTH, expand=True)
+        self.loading_label = ctk.CTkLabel(self.plot_frame, text='Loading...', font=('', 20))
+        self.loading_label.place(relx=0.5, rely=0.5, anchor='center')
 
         bottom_frame = ctk.CTkFrame(self, height=100)
         bottom_frame.pack(side=ctk.BOTTOM, pady=10)
@@ -52,6 +55,65 @@ class Application(ctk.CTk):
         self.setup_gui(bottom_frame)
         self.finalize_setup(bottom_frame)
 
+        # Runs once the main loop has shown the window
+        self.after(0, lambda: self.record_startup("Startup window"))
+        self.wait_for_plotting(plotting_import)
+
+    def record_startup(self, name: str):
+        # Time since the module started importing, printed once and kept with the other timings
+        elapsed_ns: int = time.perf_counter_ns() - startup_start_ns
+        Timer.record(name, elapsed_ns)
+        print(f"{name}: {elapsed_ns / 1e6:.0f} ms")
+
+    def wait_for_plotting(self, plotting_import: threading.Thread):
+        if plotting_import.is_alive():
+            self.after(20, lambda: self.wait_for_plotting(plotting_import))
+            return
+
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+        self.setup_graph()
+        self.loading_label.destroy()
+        self.canvas = FigureCanvasTkAgg(self.fig, master=self.plot_frame)
+        self.canvas.draw()
+        self.canvas.get_tk_widget().pack(side=ctk.TOP, fill=ctk.BOTH, expand=True)
+        self.start_animation()
+
+        # The checkbox could be ticked while loading
+        if self.pid_terms_checkbox.get():
+            self.show_pid_terms(True)
+        self.record_startup("Startup graph")
+
+    def setup_data(self, data_file_path):
+        # Everything update_graph needs besides the widgets, also used by the headless benchmark
+        self.data_file_path = data_file_path
+
+        # Initialize attributes
+        self.control_buttons: Dict[str, ctk.CTkButton] = {}
+        self.parameters_entries: Dict[str, Dict[str, ctk.CTkEntry]] = {'Substrate': {}, 'Source': {}, 'Additional': {}, 'Savenames': {}}
+        self.info_labels = {}
+
+        self.last_substrate_temp: float = 0
+        self.last_source_temp: float = 0
+
+        # Frame timing, shown in the GUI and dumped to a file periodically
+        self.frame_interval_ms: int = 920
+        self.last_frame_start: Optional[int] = None
+        self.frame_time_label: Optional[ctk.CTkLabel] = None
+        self.timings_file_path = 'data/timings.json'
+        self.first_data_drawn: bool = False
+
+        # View menu entries, live window length in minutes
+        self.view_windows: Dict[str, Optional[float]] = {'All': None, 'Last 5 min': 5, 'Last 15 min': 15, 'Last 60 min': 60}
+        self.view_menu: Optional[ctk.CTkOptionMenu] = None
+        self.ani = None
+
+        # Parsing and statistics run on the pipeline thread, frames only draw its snapshots
+        self.pipeline = DataPipeline(self.data_file_path, period_s=self.frame_interval_ms / 4000)
+
+        # Runs are archived when they are cleared
+        self.run_archive = RunArchive()
+
     # ========== Buttons and callbacks ==========
     def setup_buttons_and_callbacks(self, parent):
         # Callbacks
@@ -72,6 +134,50 @@ class Application(ctk.CTk):
                 )
             execute_with_error_handling(action)
 
+        # SET answers take up to seconds per line, and never come from a board flashed before SET
+        # support, so sends run on their own thread, one at a time. Errors are shown by the status updater
+        self.parameter_send_lock:   threading.Lock = threading.Lock()
+        self.parameter_send_errors: queue.Queue    = queue.Queue()
+        def send_parameters(values):
+            def send():
+                with self.parameter_send_lock:
+                    try:
+                        print("Parameters applied:", ProcessManager.set_parameters(values))
+                    except Exception as error:
+                        self.parameter_send_errors.put(error)
+            threading.Thread(target=send, name='ParameterSend', daemon=True).start()
+
+        def apply_button_callback():
+            # Send the parameters to the running sketch, no compile and no controller reset
+            execute_with_error_handling(lambda: send_parameters(FileManager.parameter_values(self.parameters_entries)))
+
+        def clear_button_callback():
+            # The run is archived before the file is cleared, then the parser drops what it parsed.
+            # A running reader truncates the files on its own thread and keeps appending
+            name: str = str(self.parameters_entries['Additional']['Name'].get())
+            try:
+                interval_temp: Optional[float] = float(self.parameters_entries['Additional']['Interval temp'].get())
+            except ValueError:
+                interval_temp = None
+            def archive_and_clear(reader):
+                try:
+                    self.run_archive.archive(reader, name, interval_temp)
+                finally:
+                    ProcessManager.clear_data(self.data_file_path)
+                    reader.reset()
+            self.pipeline.submit(archive_and_clear)
+
+        def history_button_callback():
+            # Pulls in matplotlib, only loaded when asked for
+            from history_window import HistoryWindow
+            HistoryWindow(self, self.run_archive)
+
+        def save_button_callback():
+            # The export runs on the pipeline thread, it owns the parsed series
+            output_filename: str = str(self.parameters_entries['Additional']['Name'].get())
+            file_format: str = export_format_menu.get().lower()
+            self.pipeline.submit(lambda reader: FileManager.save_graph_data(self.data_file_path, output_filename, reader, file_format))
+
         def fix_offsets():
             print("fix_offsets")
 
@@ -92,18 +198,38 @@ class Application(ctk.CTk):
                 set_text(substrate_offset, str(perfect_substrate_offset))
                 set_text(source_offset, str(perfect_source_offset))
                 print("Updated offsets")
+
+                # Applied right away while the board is connected
+                if ProcessManager.is_process_running():
+                    send_parameters({'SUBSTRATE_TEMP_OFFSET': str(perfect_substrate_offset),
+                                     'SOURCE_TEMP_OFFSET': str(perfect_source_offset)})
             except Exception as error:
                 print("Exception occured during fixing offsets:", error)
         
 
+        # PID terms subplot, the trace lines are only updated while it is shown
+        self.pid_terms_checkbox = ctk.CTkCheckBox(parent, text='PID terms',
+            command=lambda: self.show_pid_terms(bool(self.pid_terms_checkbox.get())))
+        self.pid_terms_checkbox.grid(row=0, column=7)
+
+        # Whole run or a live window of the last minutes, which keeps memory and frame time constant
+        self.view_menu = ctk.CTkOptionMenu(parent, values=list(self.view_windows))
+        self.view_menu.grid(row=5, column=7)
+
+        # CSV with every channel or the same columns compressed in a .npz
+        export_format_menu = ctk.CTkOptionMenu(parent, values=['CSV', 'NPZ'])
+        export_format_menu.grid(row=4, column=8)
+
         # Linking callbacks and buttons
         button_properties = [
             ['Status',  0, 0, lambda: None],
-            ['Start',   1, 0, lambda: execute_with_error_handling(ProcessManager.start_process)],
+            ['Start',   1, 0, lambda: execute_with_error_handling(lambda: ProcessManager.start_process(self.data_file_path))],
             ['Stop',    2, 0, lambda: ProcessManager.stop_process()],
             ['Compile', 3, 0, lambda: compile_button_callback()],
-            ['Clear',   4, 0, lambda: FileManager.clear_file(self.data_file_path)],
-            ['Save',    4, 6, lambda: FileManager.save_graph_data(self.data_file_path, self.parameters_entries)],
+            ['Clear',   4, 0, lambda: clear_button_callback()],
+            ['Apply',   5, 0, lambda: apply_button_callback()],
+            ['Save',    4, 6, lambda: save_button_callback()],
+            ['History', 5, 6, lambda: history_button_callback()],
             ['Fix offsets', 4, 7, lambda: fix_offsets()]
         ]
 
@@ -115,9 +241,8 @@ class Application(ctk.CTk):
         # Save/Load buttons
         for i in range(5):
             filename = f"savefiles/{i}.pkl"
-            save_name_entry = ctk.CTkEntry(parent)
+            save_name_entry = ctk.CTkEntry(parent, textvariable=ctk.StringVar(value=f"EmptyName#{i}"))
             save_name_entry.grid(row=i, column=10)
-            save_name_entry.insert(0, f"EmptyName#{i}")
             self.parameters_entries['Savenames'][f"{i}"] = save_name_entry
 
             save_button = ctk.CTkButton(parent, text=f"Save {i+1}", command=lambda fn=filename: FileManager.save_data(self.parameters_entries, fn))
@@ -129,8 +254,8 @@ class Application(ctk.CTk):
     # ========== Labels and entries ==========
     def setup_gui(self, parent):
         def create_entry(parent, default_value, row, column):
-            e = ctk.CTkEntry(parent)
-            e.insert(0, default_value)
+            # The text variable lets the autosaver trace edits
+            e = ctk.CTkEntry(parent, textvariable=ctk.StringVar(value=default_value))
             e.grid(row=row, column=column)
             return e
 
@@ -158,6 +283,10 @@ class Application(ctk.CTk):
             self.info_labels[label_info] = ctk.CTkLabel(parent, text='None')
             self.info_labels[label_info].grid(row=row, column=8)
 
+        ctk.CTkLabel(parent, text='Frame time').grid(row=0, column=8)
+        self.frame_time_label = ctk.CTkLabel(parent, text='None')
+        self.frame_time_label.grid(row=0, column=9)
+
 
     def finalize_setup(self, bottom_frame):
         # Apply style for better looks
@@ -167,110 +296,255 @@ class Application(ctk.CTk):
         # Try to load data from the previous session
         FileManager.load_data(self.parameters_entries, "savefiles/current.pkl", False, True)
 
-        # Update color of a status button
-        def status_updater(control_buttons):
+        # Remember why the reader stopped, the callback runs on the reader thread so only store it here
+        self.reader_exit_error: Optional[Exception] = None
+        def on_reader_exit(error):
+            self.reader_exit_error = error
+        ProcessManager.add_exit_callback(on_reader_exit)
+
+        # Update color of a status button, only touch the widget when the state changes
+        def status_updater(control_buttons, last_color=None):
             status_color = "green" if ProcessManager.is_process_running() else "red"
-            control_buttons['Status'].configure(fg_color=status_color)
-            control_buttons['Status'].after(100, lambda: status_updater(control_buttons))
+            if status_color != last_color:
+                control_buttons['Status'].configure(fg_color=status_color)
+            if self.reader_exit_error is not None:
+                error, self.reader_exit_error = self.reader_exit_error, None
+                CTkMessagebox(title="Error", message="Reader stopped, \"{}\"".format(error))
+            while not self.parameter_send_errors.empty():
+                CTkMessagebox(title="Error", message="Parameters not applied, \"{}\"".format(self.parameter_send_errors.get_nowait()))
+            control_buttons['Status'].after(100, lambda: status_updater(control_buttons, status_color))
         status_updater(self.control_buttons)
 
-        # Update color of a status button
-        def parameter_saver(self):
-            if len(self.parameters_entries['Substrate']) > 0:
-                FileManager.save_data(self.parameters_entries, "savefiles/current.pkl")
-            self.after(1000, lambda: parameter_saver(self))
-        parameter_saver(self)
-
-
-    def update_graph(self, i):
-        try:
-            # Read new data and update graph with it
-            reader = FileParser(self.data_file_path).read_file()
-        except Exception as error:
-            print("Exception occured during file parsing:", error)
-            print("Try clearing the file")
-
-
-        timer = Timer()
-
-        self.ax.clear()
-
-        timer.stop("Graph clear time")
-        timer.start()
+        # Keep the stage timings on disk, so slow frames on the lab machine can be looked at later
+        def timings_dumper():
+            try:
+                Timer.dump(self.timings_file_path)
+            except Exception as error:
+                print("Failed to dump timings:", error)
+            self.after(60 * 1000, timings_dumper)
+        self.after(60 * 1000, timings_dumper)
+
+        # Save the parameters shortly after they were edited, the file is written on the pipeline thread
+        self.parameter_autosaver = ParameterAutosaver(self, self.parameters_entries, "savefiles/current.pkl",
+            submit=lambda write: self.pipeline.submit(lambda reader: write()))
+
+        # Release the serial port and flush the log before the window goes away, an acquisition
+        # daemon keeps running
+        def on_close():
+            ProcessManager.release()
+            self.parameter_autosaver.flush()
+            self.pipeline.stop()
+            self.destroy()
+        self.protocol("WM_DELETE_WINDOW", on_close)
+
+
+    # ========== Graph ==========
+    def setup_graph(self):
+        # Artists are created once and only get new data every frame. They are animated,
+        # so a full canvas draw only renders the static background that blitting restores
+        import matplotlib.style as mplstyle
+        from matplotlib.figure import Figure
 
+        mplstyle.use('fast')
+        self.fig = Figure(figsize=(5, 4), dpi=100)
+        self.ax = self.fig.add_subplot(111)
+        self.fig.subplots_adjust(top=0.82)
+        grid = self.fig.add_gridspec(3, 1, hspace=0.35)
+        self.full_spec, self.main_spec, self.pid_spec = grid[:, 0], grid[0:2, 0], grid[2, 0]
+        self.ax.set_subplotspec(self.full_spec)
         self.ax.grid()
-        self.ax.set_title(reader.title, fontsize=20, y=1.04)
         self.ax.set_xlabel('Time, min', fontsize=20)
         self.ax.set_ylabel('Temperature, C', fontsize=20)
+        self.ax.set_xlim(0, 5)
+        self.ax.set_ylim(0, 100)
+
+        # The title changes every frame, it lives in its own axes so it is blitted as well
+        self.title_ax = self.fig.add_axes((0, 0.84, 1, 0.16))
+        self.title_ax.set_axis_off()
+        self.title_text = self.title_ax.text(0.5, 0.5, '', fontsize=20, ha='center', va='center', animated=True)
+
+        self.control1_scatter = self.ax.scatter([], [], s=3, color='b', animated=True)
+        self.control2_scatter = self.ax.scatter([], [], s=3, color='r', animated=True)
+        self.temp1_line,      = self.ax.plot([], [], label='Substrate', linewidth=3, color='b', animated=True)
+        self.temp2_line,      = self.ax.plot([], [], label='Source', linewidth=3, color='r', animated=True)
+        self.interval_start_line  = self.ax.axvline(x=0, color='g', linestyle='--', label='Interval Start', visible=False, animated=True)
+        self.interval_finish_line = self.ax.axvline(x=0, color='m', linestyle='--', label='Interval Finish', visible=False, animated=True)
+        self.update_legend(False)
+
+        # P, D and uncapped CV of both controllers from the TRACE lines, hidden by default
+        self.pid_ax = self.fig.add_subplot(self.pid_spec, sharex=self.ax)
+        self.pid_ax.grid()
+        self.pid_ax.set_xlabel('Time, min', fontsize=14)
+        self.pid_ax.set_ylabel('PID terms, %', fontsize=14)
+        # CV is capped to 0..100%, terms far outside of it are not interesting for tuning
+        self.pid_ax.set_ylim(-100, 200)
+        self.pid_ax.set_visible(False)
+        self.pid_lines = {}
+        for controller, color in (('1', 'b'), ('2', 'r')):
+            for term, linestyle in (('p', '-'), ('d', ':'), ('ucv', '--')):
+                self.pid_lines[term + controller], = self.pid_ax.plot([], [], color=color, linestyle=linestyle,
+                    label=f"{'Substrate' if controller == '1' else 'Source'} {term.upper()}", animated=True)
+        self.pid_legend = self.pid_ax.legend(fontsize=8, ncol=2, loc='upper right')
+        self.pid_legend.set_animated(True)
+
+        # Snapshot generation the limits were grown for, a new one means the data was cleared
+        self.plotted_generation: int             = 0
+        self.plotted_window:     Optional[float] = None
+
+    def update_frame_time_label(self):
+        if self.frame_time_label is None:
+            return
+        histogram = Timer.histograms["Frame update"]
+        text = f'{histogram.last_ns / 1e6:.0f} ms, p95 {histogram.percentile_ms(95):.0f} ms of {self.frame_interval_ms} ms'
+        if text != self.frame_time_label.cget('text'):
+            self.frame_time_label.configure(text = text)
+
+    def start_animation(self):
+        import matplotlib.animation as mpl_animation
+        self.ani = mpl_animation.FuncAnimation(self.fig, self.update_graph, interval=self.frame_interval_ms, blit=True, cache_frame_data=False)
+
+    def show_pid_terms(self, show: bool):
+        if self.ani is None:
+            # Graph is still loading, applied once it is there
+            return
+        self.ax.set_subplotspec(self.main_spec if show else self.full_spec)
+        self.pid_ax.set_visible(show)
+        self.ax.xaxis.label.set_visible(not show)
+
+        # The layout changed but not the view, so the cached backgrounds would still be used. Cleared
+        # the way matplotlib does on a resize, they are cached again from the next full draw
+        self.ani._blit_cache.clear()
+        self.canvas.draw()
 
-        if reader.max_time_value < 5:
+    def update_legend(self, show_interval: bool):
+        handles = [self.temp1_line, self.temp2_line]
+        if show_interval:
+            handles += [self.interval_start_line, self.interval_finish_line]
+        self.legend = self.ax.legend(handles=handles)
+        self.legend.set_animated(True)
+        self.legend_shows_interval: bool = show_interval
+
+    def animated_artists(self):
+        # Artists FuncAnimation redraws on top of the cached background
+        pid_artists = list(self.pid_lines.values()) + [self.pid_legend] if self.pid_ax.get_visible() else []
+        return [self.control1_scatter, self.control2_scatter, self.temp1_line, self.temp2_line,
+                self.interval_start_line, self.interval_finish_line, self.legend, self.title_text] + pid_artists
+
+    def fit_ylim(self, snapshot: GraphSnapshot):
+        margin: float = (snapshot.data_max - snapshot.data_min) * 0.1 + 1
+        self.ax.set_ylim(snapshot.data_min - margin, snapshot.data_max + margin)
+
+    def rescale_graph(self, snapshot: GraphSnapshot) -> bool:
+        # Grow the limits with some headroom only when the data leaves them, returns True if they changed
+        if snapshot.generation != self.plotted_generation or snapshot.window_min != self.plotted_window:
+            # Data was cleared or the view changed, shrink the limits back
+            self.plotted_generation = snapshot.generation
+            self.plotted_window = snapshot.window_min
             self.ax.set_xlim(0, 5)
+            self.ax.set_ylim(0, 100)
+            changed = True
+        else:
+            changed = False
+
+        x_max: float = self.ax.get_xlim()[1]
+        if snapshot.window_min is None:
+            if snapshot.max_time > x_max:
+                self.ax.set_xlim(0, snapshot.max_time * 1.25)
+                changed = True
+        elif changed or snapshot.max_time > x_max:
+            # The window jumps ahead by a quarter of its length, so the background is only redrawn
+            # that often. Old extremes are out of view then, the y limits fit the window again
+            start: float = max(snapshot.max_time - snapshot.window_min, 0)
+            self.ax.set_xlim(start, start + snapshot.window_min * 1.25)
+            if snapshot.count > 0:
+                self.fit_ylim(snapshot)
+            changed = True
+
+        y_min, y_max = self.ax.get_ylim()
+        if snapshot.data_min < y_min or snapshot.data_max > y_max:
+            self.fit_ylim(snapshot)
+            changed = True
+
+        return changed
 
-        timer.stop("Graph setup time")
-        timer.start()
-
+    def update_graph(self, i):
+        frame_timer = Timer()
+        if self.last_frame_start is not None:
+            Timer.record("Frame interval", frame_timer.start_time - self.last_frame_start)
+        self.last_frame_start = frame_timer.start_time
 
-        self.ax.scatter(reader.time_values, reader.control1_values, s=3, color='b')
-        self.ax.scatter(reader.time_values, reader.control2_values, s=3, color='r')
-        self.ax.plot(reader.time_values, reader.temp1_values, label='Substrate', linewidth=3, color='b')
-        self.ax.plot(reader.time_values, reader.temp2_values, label='Source', linewidth=3, color='r')
+        # Settings the pipeline needs from the widgets, they can only be read on this thread
+        try:
+            interval_temp: Optional[float] = float(self.parameters_entries['Additional']['Interval temp'].get())
+        except:
+            interval_temp = None
+        window_min: Optional[float] = self.view_windows[self.view_menu.get()] if self.view_menu is not None else None
+        self.pipeline.update_settings(interval_temp, point_budget(self.ax.bbox.width), self.pid_ax.get_visible(), window_min)
 
-        timer.stop("Scatter time")
-        timer.start()
+        # Nothing new since the last frame, the artists keep their data
+        snapshot: Optional[GraphSnapshot] = self.pipeline.take_snapshot()
+        if snapshot is None:
+            frame_timer.stop("Frame update")
+            self.update_frame_time_label()
+            return self.animated_artists()
 
-        self.ax.legend()
+        timer = Timer()
 
-        if len(reader.temp1_values) > 0 and len(reader.temp2_values) > 0:
-            self.last_substrate_temp = reader.temp1_values[-1]
-            self.last_source_temp = reader.temp2_values[-1]
+        # Limits changed, redraw the static background (ticks, grid); blitting caches it for the new view
+        redraw: bool = self.rescale_graph(snapshot)
+        self.title_text.set_text(snapshot.title)
 
-        # Update labels with info
-        def find_temperature_interval(temp_values, X):
-            left_boundary_index = None
-            right_boundary_index = None
-            for i, value in enumerate(temp_values):
-                if left_boundary_index is None and value > X:
-                    left_boundary_index = i
-                elif left_boundary_index is not None and value >= X:
-                    right_boundary_index = i
-            return [left_boundary_index, right_boundary_index] if left_boundary_index is not None and right_boundary_index is not None else None
-
-        temperature_interval = None
-        try:
-            temperature_interval = find_temperature_interval(reader.temp2_values,
-                float(self.parameters_entries['Additional']['Interval temp'].get()))
-        except:
-            print('Failed to compute interval')
+        timer.stop("Graph setup")
+        timer.start()
 
-        if temperature_interval is not None:
-            self.ax.axvline(x=reader.time_values[temperature_interval[0]], color='g', linestyle='--', label='Interval Start')
-            self.ax.axvline(x=reader.time_values[temperature_interval[1]], color='m', linestyle='--', label='Interval Finish')
-            self.ax.legend()
+        # Already decimated to the plot width by the pipeline
+        self.control1_scatter.set_offsets(np.column_stack(snapshot.series['control1']))
+        self.control2_scatter.set_offsets(np.column_stack(snapshot.series['control2']))
+        self.temp1_line.set_data(*snapshot.series['temp1'])
+        self.temp2_line.set_data(*snapshot.series['temp2'])
+        if self.pid_ax.get_visible():
+            for column, line in self.pid_lines.items():
+                if column in snapshot.series:
+                    line.set_data(*snapshot.series[column])
+
+        timer.stop("Graph data")
+        timer.start()
 
-            try:
-                interval_sec = temperature_interval[1] - temperature_interval[0]
-                text = f'{interval_sec // 60}m {interval_sec % 60}s'
-                self.info_labels['Time of sublimation'].configure(text = text)
-
-                for info_label, data_source in {'Median substrate temperature': reader.temp1_values, 'Median source temperature': reader.temp2_values}.items():
-                    interval_values = data_source[temperature_interval[0]:temperature_interval[1]]
-                    median_value = np.median(interval_values)
-                    deviation_value = np.std(interval_values)
-                    text = f'{median_value:.2f}°C\\{deviation_value:.2f}°C'
-                    self.info_labels[info_label].configure(text = text)
-            except Exception as e:
-                print('Caught exception ' + str(e))
+        if snapshot.count > 0:
+            self.last_substrate_temp, self.last_source_temp = snapshot.last_temps
 
+        # Update labels with info
+        if snapshot.interval is not None:
+            self.interval_start_line.set_xdata([snapshot.interval[0]] * 2)
+            self.interval_finish_line.set_xdata([snapshot.interval[1]] * 2)
+            for label_name, text in snapshot.interval_texts.items():
+                if self.info_labels.get(label_name) is not None:
+                    self.info_labels[label_name].configure(text = text)
         else:
             for label_name, label_widget in self.info_labels.items():
                 if label_widget is not None:
                     label_widget.configure(text = 'None')
 
-        timer.stop("Additional plot calculations\n")
-        # timer.start()
-        # self.fig.canvas.draw()
-        # timer.stop("Canvas draw")
+        show_interval: bool = snapshot.interval is not None
+        self.interval_start_line.set_visible(show_interval)
+        self.interval_finish_line.set_visible(show_interval)
+        if show_interval != self.legend_shows_interval:
+            self.update_legend(show_interval)
+
+        if redraw:
+            self.fig.canvas.draw()
+
+        timer.stop("Graph stats")
+        frame_timer.stop("Frame update")
+        self.update_frame_time_label()
+
+        if not self.first_data_drawn and snapshot.count > 0:
+            self.first_data_drawn = True
+            self.record_startup("Startup first data")
+
+        return self.animated_artists()
 
 
-app = Application()
-app.mainloop()
+if __name__ == '__main__':
+    app = Application()
+    app.mainloop()
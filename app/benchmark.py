@@ -0,0 +1,245 @@
+import argparse, json, os, random, tempfile, time
+import numpy as np
+from typing import Callable, Dict, List, Optional
+
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from file_manager import FileParser, FileManager
+from interval_stats import IntervalTracker
+from run_file import convert_text_log
+
+# Headless benchmarks of the parsing, export, statistics and rendering paths on synthetic logs.
+# Usage: python3 app/benchmark.py [--sizes 1000 10000] [--repeat 5] [--frames 50] [--output results.json]
+
+
+class ConstantEntry:
+    # Stands in for a CTkEntry
+    def __init__(self, value: str):
+        self.value: str = value
+
+    def get(self) -> str:
+        return self.value
+
+
+class Controller:
+    # Same PD logic as Controller::calculateControlValue in sketch.ino, driving a first order heater model
+    def __init__(self, target_temp: int, temp_offset: int, kp: float, kd: float, heating_rate: float):
+        self.target_temp:    int   = target_temp
+        self.temp_offset:    int   = temp_offset
+        self.kp:             float = kp
+        self.kd:             float = kd
+        self.heating_rate:   float = heating_rate
+        self.temperature:    float = 20
+        self.previous_error: float = 0
+        self.error:          float = 0
+        self.deriv:          float = 0
+        self.p:              float = 0
+        self.d:              float = 0
+        self.uncapped_cv:    float = 0
+        self.cv:             float = 0
+
+    def step(self, deposition_ended: bool, noise: float):
+        self.temperature += self.heating_rate * self.cv - (self.temperature - 20) * 0.004 + noise
+        self.error = self.target_temp + self.temp_offset - self.temperature
+        self.deriv = self.error - self.previous_error
+        self.previous_error = self.error
+        self.p = self.kp * self.error
+        self.d = self.kd * self.deriv
+        self.uncapped_cv = self.p + self.d
+        self.cv = 0 if deposition_ended else self.uncapped_cv
+        if self.cv < 0.01: self.cv = 0.0
+        if self.cv > 0.99: self.cv = 1.0
+
+    def trace(self, index: int, name: str) -> str:
+        return "TRACE: %d %s   ERR=%3d   P=%3d   D=%3d   uCV=%3d   CV=%3d   T=%3d\n" % (
+            index, name, int(self.error), int(self.p * 100), int(self.d * 100),
+            int(self.uncapped_cv * 100), int(self.cv * 100), int(self.temperature))
+
+
+def format_temp(temp: float) -> str:
+    # ip()/fp() pair of the sketch
+    return "%d.%02d" % (int(temp), int((temp - int(temp)) * 100))
+
+
+def generate_log(path: str, samples: int, seed: int = 0):
+    # Writes a log in the exact format Reactor::sendParameters/sendData produce, one sample per second
+    rng = random.Random(seed)
+    substrate = Controller(420, 12, 0.02, 0.60, 9)
+    source    = Controller(460, 24, 0.02, 0.40, 10)
+    deposition_time_s: int = 30 * 60
+    timer_state: str = 'OFF'
+    deposition_end: int = 0
+
+    with open(path, 'w') as file:
+        file.write("START: Substrate: T=(%3d+%2d) PD=(%d.%02d,%d.%02d); Source: T=(%3d+%2d) PD=(%d.%02d,%d.%02d); TIMER: %lus\n\n" % (
+            420, 12, 0, 2, 0, 60, 460, 24, 0, 2, 0, 40, deposition_time_s))
+
+        lines: List[str] = []
+        for second in range(samples):
+            substrate.step(timer_state == 'ENDED', rng.gauss(0, 0.3))
+            source.step(timer_state == 'ENDED', rng.gauss(0, 0.3))
+
+            if timer_state == 'OFF' and source.temperature + 5 >= source.target_temp and abs(source.deriv) < 50:
+                timer_state, deposition_end = 'STARTED', second + deposition_time_s
+            elif timer_state == 'STARTED' and second >= deposition_end:
+                timer_state = 'ENDED'
+
+            lines.append("INFO: %d,%s,%d,%s,%d\n" % (second, format_temp(substrate.temperature), int(substrate.cv * 100),
+                                                    format_temp(source.temperature), int(source.cv * 100)))
+            lines.append(substrate.trace(1, "SUBSTR"))
+            lines.append(source.trace(2, "SOURCE"))
+            if timer_state == 'STARTED':
+                lines.append("TIMER STARTED:  time left = %d sec\n" % (deposition_end - second))
+            else:
+                lines.append(f"TIMER {timer_state}\n")
+            lines.append("\n")
+
+            if rng.random() < 0.001:
+                lines.append("Overshoot\nOvershoot\nOvershoot\n")
+
+            if len(lines) > 50000:
+                file.writelines(lines)
+                lines = []
+        file.writelines(lines)
+
+
+def measure(function: Callable[[], None], repeat: int) -> List[float]:
+    timings: List[float] = []
+    for _ in range(repeat):
+        start: int = time.perf_counter_ns()
+        function()
+        timings.append((time.perf_counter_ns() - start) / 1e6)
+    return timings
+
+
+def summarize(name: str, samples: int, timings: List[float], items: Optional[int] = None) -> Dict:
+    p50: float = float(np.percentile(timings, 50))
+    p95: float = float(np.percentile(timings, 95))
+    items = samples if items is None else items
+    return {'benchmark': name, 'samples': samples, 'runs': len(timings), 'p50_ms': p50, 'p95_ms': p95,
+            'samples_per_s': items / (p50 / 1000) if p50 > 0 else float('inf')}
+
+
+def append_sample(path: str, second: int):
+    with open(path, 'a') as file:
+        file.write("INFO: %d,420.25,40,460.50,55\n"
+                   "TRACE: 1 SUBSTR   ERR= 11   P= 22   D=  3   uCV= 25   CV= 25   T=420\n"
+                   "TRACE: 2 SOURCE   ERR= 23   P= 46   D= -2   uCV= 44   CV= 44   T=460\n"
+                   "TIMER OFF\n\n" % second)
+
+
+def make_offscreen_application(data_file_path: str):
+    # Application without a Tk window, only the parts update_graph uses, rendered with Agg.
+    # The pipeline thread isn't started, its steps are called directly
+    from app import Application
+
+    application = Application.__new__(Application)
+    application.setup_data(data_file_path)
+    application.parameters_entries['Additional']['Interval temp'] = ConstantEntry('455')
+    application.setup_graph()
+    application.fig.set_size_inches(16, 6)
+    FigureCanvasAgg(application.fig)
+    return application
+
+
+class OffscreenRenderer:
+    # What FuncAnimation does with blit=True: update the artists, restore the cached background, draw them on top
+    def __init__(self, application):
+        self.application = application
+        self.background = None
+        self.background_view = None
+
+    def render_frame(self):
+        artists = self.application.update_graph(None)
+        canvas = self.application.fig.canvas
+        view = (self.application.ax.get_xlim(), self.application.ax.get_ylim())
+        if self.background_view != view:
+            canvas.draw()
+            self.background = canvas.copy_from_bbox(self.application.fig.bbox)
+            self.background_view = view
+        canvas.restore_region(self.background)
+        for artist in artists:
+            artist.axes.draw_artist(artist)
+
+
+def run_size(directory: str, samples: int, repeat: int, frames: int) -> List[Dict]:
+    results: List[Dict] = []
+    log_path: str = os.path.join(directory, 'data', f'synthetic_{samples}.txt')
+    if not os.path.exists(log_path):
+        start: float = time.perf_counter()
+        generate_log(log_path, samples)
+        print(f"Generated {samples} samples in {time.perf_counter() - start:.1f} s")
+
+    # Parsing
+    results.append(summarize('read_file text', samples,
+                             measure(lambda: FileParser(log_path, use_run_file=False).read_file(), repeat)))
+    convert_text_log(log_path)
+    results.append(summarize('read_file run file', samples,
+                             measure(lambda: FileParser(log_path).read_file(), repeat)))
+
+    # Export of an already parsed run
+    reader = FileParser(log_path).read_file()
+    for file_format in ('csv', 'npz'):
+        results.append(summarize(f'save_graph_data {file_format}', samples,
+                                 measure(lambda: FileManager.save_graph_data(log_path, f'benchmark_{samples}', reader, file_format), repeat)))
+
+    # Interval statistics, from scratch and per frame
+    results.append(summarize('interval stats full', samples,
+                             measure(lambda: IntervalTracker().update(reader.series, 455), repeat)))
+
+    # Live frames, one new sample each, on a copy that can grow
+    live_path: str = os.path.join(directory, 'data', 'live.txt')
+    with open(log_path, 'rb') as source, open(live_path, 'wb') as destination:
+        destination.write(source.read())
+    application = make_offscreen_application(live_path)
+    pipeline = application.pipeline
+    renderer = OffscreenRenderer(application)
+    renderer.render_frame()
+    pipeline.step()
+    renderer.render_frame()
+
+    parse_timings: List[float] = []
+    snapshot_timings: List[float] = []
+    render_timings: List[float] = []
+    for frame in range(frames):
+        append_sample(live_path, samples + frame)
+        parse_timings += measure(pipeline.ingest, 1)
+        snapshot_timings += measure(pipeline.publish, 1)
+        render_timings += measure(renderer.render_frame, 1)
+    results.append(summarize('read_file frame', samples, parse_timings, 1))
+    results.append(summarize('pipeline snapshot frame', samples, snapshot_timings, 1))
+    results.append(summarize('update_graph render frame', samples, render_timings, 1))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parser and render benchmarks on synthetic logs")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=5, help="Runs of the whole-file benchmarks")
+    parser.add_argument('--frames', type=int, default=50, help="Live frames to measure")
+    parser.add_argument('--directory', help="Keep generated logs here instead of a temporary directory")
+    parser.add_argument('--output', help="Write results as JSON")
+    args = parser.parse_args()
+
+    output: Optional[str] = os.path.abspath(args.output) if args.output else None
+    directory: str = os.path.abspath(args.directory or tempfile.mkdtemp(prefix='arduino_benchmark_'))
+    os.makedirs(os.path.join(directory, 'data'), exist_ok=True)
+    # save_graph_data writes to data/ relative to the working directory
+    os.chdir(directory)
+
+    results: List[Dict] = []
+    print(f"{'benchmark':<28}{'samples':>10}{'p50 ms':>12}{'p95 ms':>12}{'samples/s':>14}")
+    for samples in args.sizes:
+        for result in run_size(directory, samples, args.repeat, args.frames):
+            results.append(result)
+            print(f"{result['benchmark']:<28}{result['samples']:>10}{result['p50_ms']:>12.2f}{result['p95_ms']:>12.2f}{result['samples_per_s']:>14.0f}")
+
+    if output:
+        with open(output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import json, socket, threading
+from typing import Dict
+
+
+class DaemonClient:
+    # Connection to the acquisition daemon. One JSON object per line each way, see
+    # AcquisitionDaemon.handle for the commands. Shared by the Tk and the pipeline thread.
+    # The timeout is longer than the daemon's own waits for the board, e.g. SET answers
+    def __init__(self, socket_path: str, timeout: float = 10.0):
+        self.socket_path: str            = socket_path
+        self.timeout:     float          = timeout
+        self.lock:        threading.Lock = threading.Lock()
+        self.socket = None
+        self.file   = None
+        self.connect()
+
+    def connect(self):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(self.timeout)
+        try:
+            connection.connect(self.socket_path)
+        except OSError:
+            connection.close()
+            raise
+        self.socket, self.file = connection, connection.makefile('rwb')
+
+    def request(self, message: Dict) -> Dict:
+        # Raises ValueError with the daemon's message if the command failed, OSError if it is gone
+        with self.lock:
+            try:
+                if self.file is None:
+                    self.connect()
+                self.file.write(json.dumps(message).encode() + b'\n')
+                self.file.flush()
+                line: bytes = self.file.readline()
+                if not line:
+                    raise ConnectionError("Acquisition daemon closed the connection")
+            except OSError:
+                # The answer may still arrive after a timeout, the next request uses a new
+                # connection so it can't be taken for its own
+                self.disconnect()
+                raise
+        response: Dict = json.loads(line)
+        if 'error' in response:
+            raise ValueError(response['error'])
+        return response
+
+    def disconnect(self):
+        try:
+            if self.file is not None:
+                # Flushes a request that wasn't sent, which fails again on a broken connection
+                self.file.close()
+        except OSError:
+            pass
+        finally:
+            if self.socket is not None:
+                self.socket.close()
+            self.socket = self.file = None
+
+    def close(self):
+        with self.lock:
+            self.disconnect()
@@ -0,0 +1,259 @@
+import queue, threading, time
+import numpy as np
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from file_manager import FileParser
+from process_manager import ProcessManager
+from my_timer import Timer
+from decimation import decimate_series
+from interval_stats import IntervalTracker
+
+# Reading, parsing, statistics and decimation run on a worker thread. The Tk thread only takes
+# the newest snapshot and hands its arrays to the artists
+
+
+class GraphSnapshot(NamedTuple):
+    # Everything a frame draws. The arrays are copies, the worker never touches them again
+    generation:   int    # changes when the data was cleared
+    count:        int
+    title:        str
+    max_time:     float
+    data_min:     float
+    data_max:     float
+    series:       Dict[str, Tuple[np.ndarray, np.ndarray]]  # decimated (time, values) per channel
+    window_min:   Optional[float]                           # live window length, None for the whole run
+    interval:     Optional[Tuple[float, float]]             # start and finish time of sublimation
+    interval_texts: Dict[str, str]                          # info label name -> text
+    last_temps:   Tuple[float, float]                       # substrate, source
+    built_ns:     int
+
+
+class DataPipeline(threading.Thread):
+    # Channels drawn on the main axes, the PID lines are added while they are shown
+    main_channels = ('temp1', 'temp2', 'control1', 'control2')
+    pid_channels  = ('p1', 'd1', 'ucv1', 'p2', 'd2', 'ucv2')
+
+    # Samples kept in memory while a live window is shown, enough for the longest window
+    live_window_samples: int = 60 * 60
+
+    def __init__(self, data_file_path: str, period_s: float = 0.25, max_snapshot_age_s: float = 1.0):
+        super().__init__(daemon=True, name='DataPipeline')
+        self.reader:           FileParser      = FileParser(data_file_path)
+        self.interval_tracker: IntervalTracker = IntervalTracker()
+        self.period_s:           float = period_s
+        # A snapshot the UI did not take yet is only replaced once it is this old, so a UI that
+        # falls behind doesn't make the worker decimate and copy for nothing
+        self.max_snapshot_age_s: float = max_snapshot_age_s
+
+        # Full resolution tail of the decimated series, one sample per second
+        self.full_resolution_samples: int = 5 * 60
+
+        # Single slot, the UI always gets the newest snapshot and older ones are dropped
+        self.snapshot_lock: threading.Lock          = threading.Lock()
+        self.snapshot:      Optional[GraphSnapshot] = None
+
+        # Work that needs the parser (clear, export) or the disk, run between ingest steps
+        self.tasks:      queue.Queue     = queue.Queue()
+        self.wake_event: threading.Event = threading.Event()
+        self.stop_event: threading.Event = threading.Event()
+
+        # Set by the UI thread, read by the worker. Tk widgets can't be read from here
+        self.interval_temp: Optional[float] = None
+        self.point_budget:  int             = 2000
+        self.show_pid:      bool            = False
+        self.window_min:    Optional[float] = None
+        self.settings_version: int          = 0
+
+        # Worker state
+        self.generation:     int   = 0
+        self.tracked_series        = self.reader.series
+        self.range_count:    int   = 0
+        self.data_min:       float = np.inf
+        self.data_max:       float = -np.inf
+        self.built_count:    int   = -1
+        self.built_version:  int   = -1
+        self.built_title:    str   = ''
+
+    # ========== UI thread ==========
+    def update_settings(self, interval_temp: Optional[float], point_budget: int, show_pid: bool, window_min: Optional[float]):
+        settings = (interval_temp, point_budget, show_pid, window_min)
+        if settings != (self.interval_temp, self.point_budget, self.show_pid, self.window_min):
+            self.interval_temp, self.point_budget, self.show_pid, self.window_min = settings
+            self.settings_version += 1
+            self.wake_event.set()
+
+    def take_snapshot(self) -> Optional[GraphSnapshot]:
+        # Newest unseen snapshot or None if nothing changed since the last one
+        with self.snapshot_lock:
+            snapshot, self.snapshot = self.snapshot, None
+        return snapshot
+
+    def submit(self, task: Callable[[FileParser], None]):
+        # Runs task(reader) on the worker thread, errors are printed
+        self.tasks.put(task)
+        self.wake_event.set()
+
+    def stop(self, timeout: float = 2.0) -> bool:
+        self.stop_event.set()
+        self.wake_event.set()
+        self.join(timeout)
+        return not self.is_alive()
+
+    # ========== Worker thread ==========
+    def run(self):
+        while not self.stop_event.is_set():
+            self.wake_event.wait(self.period_s)
+            self.wake_event.clear()
+            self.step()
+        # Writes submitted right before the stop, e.g. the last parameter save
+        self.run_tasks()
+
+    def step(self):
+        # One ingest and publish round, called directly when there is no worker thread (benchmark)
+        self.run_tasks()
+        with Timer.span("Pipeline ingest"):
+            self.ingest()
+        with Timer.span("Pipeline snapshot"):
+            self.publish()
+
+    def run_tasks(self):
+        while True:
+            try:
+                task = self.tasks.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                task(self.reader)
+            except Exception as error:
+                print("Exception occured in background task:", error)
+
+    def ingest(self):
+        try:
+            # From the acquisition daemon if there is one, else directly from the serial reader while it runs
+            serial_reader = ProcessManager.serial_reader
+            if ProcessManager.daemon_client is not None:
+                # Nothing new while the daemon is unreachable, the log it owns may be behind what was read
+                if ProcessManager.poll_daemon():
+                    try:
+                        self.reader.read_daemon(ProcessManager.daemon_client)
+                    except OSError as error:
+                        ProcessManager.daemon_lost(error)
+            elif serial_reader is not None and (serial_reader.is_alive() or not serial_reader.lines.empty()):
+                self.reader.read_serial(serial_reader)
+            else:
+                self.reader.read_file()
+        except Exception as error:
+            print("Exception occured during file parsing:", error)
+            print("Try clearing the file")
+
+    def apply_window(self):
+        # A live window only keeps the newest samples in memory. The whole run is read back from
+        # disk when it is shown again
+        reader = self.reader
+        max_samples: Optional[int] = None if self.window_min is None else self.live_window_samples
+        if max_samples != reader.max_samples:
+            reader.set_max_samples(max_samples)
+            # Data range of the whole run has to be collected again
+            self.range_count = 0
+            self.data_min, self.data_max = np.inf, -np.inf
+
+    def update_range(self):
+        # Data range, only from the samples added since the previous round. Counts are sample
+        # numbers, a bounded series may have dropped older rows
+        reader = self.reader
+        first: int = reader.series.dropped
+        count: int = first + len(reader.series)
+        if reader.series is not self.tracked_series or count < self.range_count:
+            self.tracked_series = reader.series
+            self.generation += 1
+            self.range_count = 0
+            self.data_min, self.data_max = np.inf, -np.inf
+
+        if count > self.range_count:
+            new_samples = slice(max(self.range_count - first, 0), count - first)
+            for values in (reader.temp1_values, reader.temp2_values, reader.control1_values, reader.control2_values):
+                self.data_min = min(self.data_min, float(values[new_samples].min()))
+                self.data_max = max(self.data_max, float(values[new_samples].max()))
+            self.range_count = count
+
+    def update_interval(self) -> Optional[Tuple[int, int]]:
+        tracker = self.interval_tracker
+        series = self.reader.series
+        restarted: bool = series is not tracker.series or self.interval_temp != tracker.threshold
+        if (restarted and series.dropped > 0) or tracker.processed < series.dropped:
+            # The tracker starts over, or samples it hasn't seen were dropped already. Those aren't
+            # in memory, so the whole run is scanned from disk once
+            tracker.update(self.reader.full_history().series, self.interval_temp)
+            tracker.series = series
+        return tracker.update(series, self.interval_temp)
+
+    def publish(self):
+        reader = self.reader
+        self.apply_window()
+        self.update_range()
+
+        count: int = reader.series.dropped + len(reader.series)
+        if (count, self.settings_version, reader.title) == (self.built_count, self.built_version, self.built_title):
+            return
+
+        with self.snapshot_lock:
+            pending = self.snapshot
+        if pending is not None and time.perf_counter_ns() - pending.built_ns < self.max_snapshot_age_s * 1e9:
+            # Back-pressure, the UI hasn't drawn the previous one; it is coalesced into the next round
+            return
+
+        snapshot = self.build_snapshot()
+        self.built_count, self.built_version, self.built_title = count, self.settings_version, reader.title
+        with self.snapshot_lock:
+            self.snapshot = snapshot
+
+    def build_snapshot(self) -> GraphSnapshot:
+        reader = self.reader
+        budget: int = self.point_budget
+
+        # Only the samples of the live window are drawn, their number doesn't grow with the run
+        shown = slice(0, len(reader.series))
+        data_min, data_max = self.data_min, self.data_max
+        if self.window_min is not None:
+            shown = slice(max(len(reader.series) - int(self.window_min * 60), 0), len(reader.series))
+            if shown.stop > shown.start:
+                values = [reader.series.column(channel)[shown] for channel in self.main_channels]
+                data_min = float(min(channel_values.min() for channel_values in values))
+                data_max = float(max(channel_values.max() for channel_values in values))
+
+        def decimated(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+            # Copies, so appends and resets can't change what the UI draws
+            x, y = decimate_series(reader.time_values[shown], values[shown], budget, self.full_resolution_samples)
+            return np.array(x), np.array(y)
+
+        series = {channel: decimated(reader.series.column(channel)) for channel in self.main_channels}
+        if self.show_pid:
+            for channel in self.pid_channels:
+                series[channel] = decimated(reader.trace_values(channel))
+
+        interval: Optional[Tuple[float, float]] = None
+        interval_texts: Dict[str, str] = {}
+        if self.interval_temp is not None:
+            index_interval = self.update_interval()
+            if index_interval is not None:
+                interval = self.interval_tracker.interval_times
+                interval_sec = index_interval[1] - index_interval[0]
+                interval_texts['Time of sublimation'] = f'{interval_sec // 60}m {interval_sec % 60}s'
+                for info_label, channel in {'Median substrate temperature': 'temp1', 'Median source temperature': 'temp2'}.items():
+                    stats = self.interval_tracker.stats[channel]
+                    interval_texts[info_label] = f'{stats.median:.2f}°C\\{stats.std:.2f}°C'
+
+        return GraphSnapshot(
+            generation=self.generation,
+            count=reader.series.dropped + len(reader.series),
+            title=reader.title,
+            max_time=reader.max_time_value,
+            data_min=data_min,
+            data_max=data_max,
+            series=series,
+            window_min=self.window_min,
+            interval=interval,
+            interval_texts=interval_texts,
+            last_temps=(reader.series.last('temp1'), reader.series.last('temp2')),
+            built_ns=time.perf_counter_ns(),
+        )
@@ -0,0 +1,45 @@
+import numpy as np
+from typing import Tuple
+
+
+# Reduce a series to a point budget before handing it to matplotlib. The canvas can't show more
+# points than it has pixels, so a bounded number of points looks the same as the full series
+
+
+def min_max_decimate(x: np.ndarray, y: np.ndarray, buckets: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Keep the minimum and the maximum of every bucket in time order, so peaks and
+    # overshoots survive. Returns at most 2 * buckets points plus a raw tail
+    count: int = len(x)
+    if buckets <= 0 or count <= 2 * buckets:
+        return x, y
+
+    # Power of two bucket size aligned to the first sample, so bucket boundaries don't
+    # move between frames as the series grows and the plot doesn't flicker
+    bucket_size: int = 1 << int(np.ceil(np.log2(count / buckets)))
+    full_buckets: int = count // bucket_size
+    used: int = bucket_size * full_buckets
+    grouped = y[:used].reshape(full_buckets, bucket_size)
+    offsets = np.arange(full_buckets) * bucket_size
+    min_index = grouped.argmin(axis=1) + offsets
+    max_index = grouped.argmax(axis=1) + offsets
+
+    indices = np.concatenate((np.sort(np.stack((min_index, max_index), axis=1), axis=1).ravel(), np.arange(used, count)))
+    return x[indices], y[indices]
+
+
+def point_budget(axes_width_px: float, points_per_pixel: float = 2) -> int:
+    # Roughly two points per horizontal pixel of the plot area
+    return max(int(axes_width_px * points_per_pixel), 100)
+
+
+def decimate_series(x: np.ndarray, y: np.ndarray, budget: int, recent: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Decimate the history, but keep the last `recent` samples at full resolution
+    count: int = len(x)
+    if count <= budget:
+        return x, y
+
+    split: int = max(count - recent, 0)
+    history_budget: int = max(budget - (count - split), budget // 2)
+    history_x, history_y = min_max_decimate(x[:split], y[:split], history_budget // 2)
+
+    return np.concatenate((history_x, x[split:])), np.concatenate((history_y, y[split:]))
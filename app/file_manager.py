@@ -1,66 +1,276 @@
-import pickle, tkinter as tk
+import hashlib, os, pickle, tkinter as tk
 import time
 from CTkMessagebox import CTkMessagebox
-from typing import List
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
 from datetime import datetime
-import csv
+import numpy as np
 
 from my_timer import Timer
+from time_series import TimeSeries
+from run_file import clear_run_file, read_run_file, run_file_path
+
+
+class ParsedLines(NamedTuple):
+    info_rows:     List[List[float]]      # INFO numbers, the first one is the board time
+    trace_rows:    List[List[float]]      # TimeSeries.trace_columns of every INFO row, NaN if missing
+    leading_trace: Optional[List[float]]  # Trace columns from lines before the first INFO line
+    param_str:     Optional[str]          # Last START: parameters
 
 
 class FileParser:
     start_prefix: str = "START: "
     info_prefix:  str = "INFO: "
 
-    def __init__(self, output_file_path: str):
-        self.output_file_path:  str         = output_file_path
+    def __init__(self, output_file_path: str, use_run_file: bool = True, max_samples: Optional[int] = None):
+        self.output_file_path:  str           = output_file_path
+        self.use_run_file:      bool          = use_run_file
+        # Only the newest samples are kept in memory if set, the rest stays in the files
+        self.max_samples:       Optional[int] = max_samples
+        self.live_reader                      = None
+        # Log generation of the acquisition daemon the offsets belong to
+        self.daemon_generation: Optional[int] = None
+        self.file_inode:        int           = -1
+        self.reset()
+
+    def reset(self):
+        # Forget everything parsed so far, next read starts from the beginning of the file. Called
+        # right after a clear, lines still coming from a live reader then continue at offset 0
+        self.file_offset:       int         = 0
         self.last_point_time:   int         = 0
-        self.time_values:       List[float] = []
-        self.temp1_values:      List[float] = []
-        self.control1_values:   List[float] = []
-        self.temp2_values:      List[float] = []
-        self.control2_values:   List[float] = []
+        self.series:            TimeSeries  = TimeSeries(max_size=self.max_samples)
+        self.trace_series:      TimeSeries  = TimeSeries(TimeSeries.trace_columns, dtype=np.float32, max_size=self.max_samples)
         self.max_time_value:    float       = 0
         self.arduino_param_str: str         = 'No data'
         self.title:             str         = ''
 
-    def read_file(self):
+    # Column views into the series store, no copies are made
+    @property
+    def time_values(self)     -> np.ndarray: return self.series.column('time')
+    @property
+    def temp1_values(self)    -> np.ndarray: return self.series.column('temp1')
+    @property
+    def control1_values(self) -> np.ndarray: return self.series.column('control1')
+    @property
+    def temp2_values(self)    -> np.ndarray: return self.series.column('temp2')
+    @property
+    def control2_values(self) -> np.ndarray: return self.series.column('control2')
+
+    @staticmethod
+    def tokenize_lines(lines: Iterable[str]) -> ParsedLines:
+        # Single pass over the lines, dispatching on the first characters. The hot path is kept
+        # inline on purpose, a helper call per line costs as much as the parsing itself.
+        # TRACE and TIMER lines fill the trace row of the INFO line before them
+        info_rows:     List[List[float]]     = []
+        trace_rows:    List[List[float]]     = []
+        leading_trace: Optional[List[float]] = None
+        param_str:     Optional[str]         = None
+        nan:           float                 = float('nan')
+        trace_width:   int                   = len(TimeSeries.trace_columns)
+        timer_column:  int                   = TimeSeries.trace_columns.index('timer_state')
+
+        trace_row: Optional[List[float]] = None
+        for line in lines:
+            try:
+                head: str = line[:5]
+                if head == "TRACE":
+                    # "TRACE1(SUBSTR): ERR=408 P=817 ..." or "TRACE: 1 SUBSTR   ERR=408   P=817 ...". Values may
+                    # be padded ("T=  0"), after the split every number follows its "KEY=" token
+                    controller: str = line[5] if line[5] in '12' else line[7]
+                    tokens: List[str] = line.replace('=', '= ').split()
+                    if controller not in '12' or len(tokens) < 12 or tokens[-12] != 'ERR=':
+                        print(f"Unexpected trace line \"{line.rstrip()}\"")
+                        continue
+                    if trace_row is None:
+                        trace_row = leading_trace = [nan] * trace_width
+                    first_column: int = 0 if controller == '1' else 6
+                    trace_row[first_column:first_column + 6] = map(float, tokens[-11::2])
+
+                elif head == "INFO:":
+                    numbers: List[float] = list(map(float, line[6:].split(',')))
+                    if len(numbers) != 5:
+                        print(f"Unexpected number count \"{len(numbers)}\" in info line \"{line}\"")
+                        continue
+                    info_rows.append(numbers)
+                    trace_row = [nan] * trace_width
+                    trace_rows.append(trace_row)
+
+                elif head == "TIMER":
+                    # "TIMER OFF", "TIMER STARTED:  time left = 10 sec", "TIMER ENDED" or the older
+                    # "TIMER: started=0, ended=0, started_at=0". Stored as state (0 off, 1 started, 2 ended) and seconds left
+                    parts: List[str] = line.split('=')
+                    if line[5] == ':' and len(parts) == 4:
+                        timer: List[float] = [2 if parts[2][0] != '0' else 1 if parts[1][0] != '0' else 0, nan]
+                    elif line.startswith("TIMER STARTED"):
+                        timer = [1, float(parts[1].split()[0]) if len(parts) == 2 else nan]
+                    elif line.startswith("TIMER OFF"):
+                        timer = [0, nan]
+                    elif line.startswith("TIMER ENDED"):
+                        timer = [2, nan]
+                    else:
+                        continue
+                    if trace_row is None:
+                        trace_row = leading_trace = [nan] * trace_width
+                    trace_row[timer_column:timer_column + 2] = timer
+
+                elif line.startswith(FileParser.start_prefix):
+                    param_str = line[len(FileParser.start_prefix):].rstrip('\n')
+
+            except (ValueError, IndexError) as error:
+                print(f"Failed to parse line \"{line.rstrip()}\": {error}")
+
+        return ParsedLines(info_rows, trace_rows, leading_trace, param_str)
+
+    def load_run_file(self, log_size: int):
+        # Start from the binary run file instead of parsing the text log from the beginning,
+        # then only the text written after the last run file flush has to be parsed
+        run = read_run_file(run_file_path(self.output_file_path), self.output_file_path)
+        if run is None:
+            return
+        param_str, text_offset, records = run
+        if text_offset > log_size or len(records) == 0:
+            return
+
+        self.series.extend(records['info'])
+        self.trace_series.extend(records['trace'])
+        self.arduino_param_str = param_str
+        self.last_point_time = len(records)
+        self.max_time_value = (len(records) - 1) / 60
+        self.file_offset = text_offset
+
+    def parse_lines(self, lines: Iterable[str]):
+        # Rows are added to the series in one go, per-row numpy calls are far slower
+        parsed: ParsedLines = FileParser.tokenize_lines(lines)
+
+        if parsed.param_str is not None:
+            self.arduino_param_str = parsed.param_str
+
+        if parsed.leading_trace is not None and len(self.trace_series) > 0:
+            # TRACE/TIMER lines whose INFO line came with the previous chunk
+            last = self.trace_series.data[:, len(self.trace_series) - 1]
+            leading = np.array(parsed.leading_trace, dtype=last.dtype)
+            last[~np.isnan(leading)] = leading[~np.isnan(leading)]
+
+        count: int = len(parsed.info_rows)
+        if count > 0:
+            info = np.array(parsed.info_rows, dtype=self.series.data.dtype)
+            info[:, 0] = (self.last_point_time + np.arange(count)) / 60
+            self.series.extend(info)
+            self.trace_series.extend(np.array(parsed.trace_rows, dtype=self.trace_series.data.dtype))
+            self.last_point_time += count
+            self.max_time_value = max(self.max_time_value, (self.last_point_time - 1) / 60)
+
+    def trace_values(self, column: str) -> np.ndarray:
+        return self.trace_series.column(column)
+
+    def set_max_samples(self, max_samples: Optional[int]):
+        # Unbounding reads the dropped samples back from disk
+        if max_samples is None and self.series.dropped > 0:
+            self.load_history()
+        self.max_samples = max_samples
+        self.series.set_max_size(max_samples)
+        self.trace_series.set_max_size(max_samples)
+
+    def full_history(self) -> 'FileParser':
+        # Parser with every sample of the run, self if nothing was dropped
+        if self.series.dropped == 0:
+            return self
+        return FileParser(self.output_file_path, self.use_run_file).read_file(self.file_offset)
+
+    def load_history(self):
+        # Samples are dropped in the same order they were parsed, so the first rows of a full parse
+        # up to what this parser has read are exactly the dropped ones
         t = Timer()
-        with open(self.output_file_path, 'r') as file:
-            for line in file:
-                if line.startswith(self.start_prefix):
-                    self.arduino_param_str = line[len(self.start_prefix):-1]
-                    continue
+        dropped: int = self.series.dropped
+        history: FileParser = FileParser(self.output_file_path, self.use_run_file).read_file(self.file_offset)
+        count: int = min(dropped, len(history.series))
+        if count < dropped:
+            print(f"Only {count} of {dropped} earlier samples could be read back")
+        self.series.prepend(history.series.table()[:count])
+        self.trace_series.prepend(history.trace_series.table()[:count])
+        t.stop("History loading")
 
-                if not line.startswith(self.info_prefix):
-                    continue    
-                
-                numbers: List[float] = []
-                for part in line[len(self.info_prefix):].split(','):
-                    numbers.append(float(part))
+    def read_file(self, end_offset: Optional[int] = None):
+        # Only the bytes appended since the previous call are parsed, so the cost
+        # of a call is proportional to the new data and not to the run length
+        t = Timer()
+        with open(self.output_file_path, 'rb') as file:
+            stat = os.fstat(file.fileno())
 
-                if len(numbers) != 5:
-                    print(f"Unexpected number count \"{len(numbers)}\" in info line \"{line}\"")
-                    continue
+            # File was cleared or replaced, start over
+            if stat.st_size < self.file_offset or stat.st_ino != self.file_inode:
+                self.reset()
+                self.file_inode = stat.st_ino
+                if self.use_run_file:
+                    self.load_run_file(stat.st_size)
 
-                self.time_values    .append(self.last_point_time / 60)
-                self.temp1_values   .append(numbers[1])
-                self.control1_values.append(numbers[2])
-                self.temp2_values   .append(numbers[3])
-                self.control2_values.append(numbers[4])
-                self.max_time_value = max(self.max_time_value, self.last_point_time / 60 )
-                self.last_point_time += 1
-        
-        temp1 = self.temp1_values[-1] if len(self.temp1_values) > 0 else 0
-        temp2 = self.temp2_values[-1] if len(self.temp2_values) > 0 else 0
+            file.seek(self.file_offset)
+            chunk: bytes = file.read() if end_offset is None else file.read(max(end_offset - self.file_offset, 0))
+
+        # Keep the incomplete last line for the next call
+        end: int = chunk.rfind(b'\n') + 1
+        self.file_offset += end
+
+        self.parse_lines(chunk[:end].decode(errors='replace').splitlines(keepends=True))
+
+        self.update_title()
+
+        t.stop("File parsing")
+
+        return self
+
+    def read_serial(self, serial_reader):
+        # Consume lines straight from the serial reader instead of the file it writes.
+        # The reader logs exactly the bytes it queues, so file_offset stays in sync
+        # and read_file can take over once the reader is gone
+        if self.live_reader is not serial_reader:
+            self.read_file(serial_reader.start_offset)
+            self.live_reader = serial_reader
+
+        t = Timer()
+        raw_lines: List[bytes] = serial_reader.get_lines()
+        self.file_offset += sum(len(raw_line) for raw_line in raw_lines)
+        self.parse_lines(raw_line.decode(errors='replace') for raw_line in raw_lines)
+
+        self.update_title()
+
+        t.stop("Serial parsing")
+
+        return self
+
+    def read_daemon(self, client):
+        # Log bytes from the acquisition daemon, which owns the port and the log. What is already
+        # on disk is read directly the first time, run file included
+        if self.daemon_generation is None:
+            self.daemon_generation = client.request({'cmd': 'status'})['generation']
+            self.read_file()
+
+        t = Timer()
+        response = client.request({'cmd': 'read', 'offset': self.file_offset})
+        if response['generation'] != self.daemon_generation:
+            # Cleared through the daemon, start over from its beginning
+            self.reset()
+            self.daemon_generation = response['generation']
+            response = client.request({'cmd': 'read', 'offset': 0})
+
+        # A chunk read from the log may end inside a line
+        data: bytes = response['data'].encode('latin-1')
+        end: int = data.rfind(b'\n') + 1
+        self.file_offset += end
+        self.parse_lines(data[:end].decode(errors='replace').splitlines(keepends=True))
+
+        self.update_title()
+
+        t.stop("Daemon parsing")
+
+        return self
+
+    def update_title(self):
+        temp1 = self.series.last('temp1')
+        temp2 = self.series.last('temp2')
         temps_str = "Substrate Blue {:3.01f}°C, Source Red: {:3.01f}°C".format(temp1, temp2)
         date_time_now = datetime.now()
         d = date_time_now.strftime("%H:%M:%S, %d %b, %Y")
         self.title = f'{self.arduino_param_str}\n{temps_str}; {d}'
-        
-        t.stop("File parsing")
-        
-        return self
 
 class FileManager:
     @staticmethod
@@ -68,9 +278,11 @@ class FileManager:
         print("Clearing file")
         with open(output_file_path, 'w') as file:
             file.truncate(0)
+        clear_run_file(output_file_path)
 
     @staticmethod
-    def write_to_header(header_file_path, parameters_entries):
+    def parameter_values(parameters_entries) -> Dict[str, str]:
+        # Sketch parameters by their parameters.h name, the same names are used by the SET command
         # Get values from the Entry fields
         substrate_values = [entry.get() for entry in parameters_entries['Substrate'].values()]
         source_values = [entry.get() for entry in parameters_entries['Source'].values()]
@@ -82,37 +294,80 @@ class FileManager:
             except ValueError:
                 raise ValueError("Invalid float value: {}".format(value))
 
+        values: Dict[str, str] = {}
+        for prefix, section_values in (('SUBSTRATE', substrate_values), ('SOURCE', source_values)):
+            for suffix, value in zip(('TEMP', 'TEMP_OFFSET', 'KP', 'KD'), section_values):
+                values[f'{prefix}_{suffix}'] = value
+        values['DEPOSITION_TIME_MS'] = str(int(parameters_entries['Additional']['Timer'].get()) * 60 * 1000)
+        return values
+
+    @staticmethod
+    def header_content(parameters_entries) -> str:
+        values: Dict[str, str] = FileManager.parameter_values(parameters_entries)
+
         # Create the lines for the header file
         header_lines = []
         header_lines.append("/* DO NOT EDIT, AUTOGENERATED FROM gui.py */\n\n")
-        header_lines.append("static constexpr int        SUBSTRATE_TEMP        = {};\n".format(substrate_values[0]))
-        header_lines.append("static constexpr int        SUBSTRATE_TEMP_OFFSET = {};\n".format(substrate_values[1]))
-        header_lines.append("static constexpr double     SUBSTRATE_KP          = {};\n".format(substrate_values[2]))
-        header_lines.append("static constexpr double     SUBSTRATE_KD          = {};\n".format(substrate_values[3]))
+        header_lines.append("static constexpr int        SUBSTRATE_TEMP        = {};\n".format(values['SUBSTRATE_TEMP']))
+        header_lines.append("static constexpr int        SUBSTRATE_TEMP_OFFSET = {};\n".format(values['SUBSTRATE_TEMP_OFFSET']))
+        header_lines.append("static constexpr double     SUBSTRATE_KP          = {};\n".format(values['SUBSTRATE_KP']))
+        header_lines.append("static constexpr double     SUBSTRATE_KD          = {};\n".format(values['SUBSTRATE_KD']))
         header_lines.append("\n")
-        header_lines.append("static constexpr int        SOURCE_TEMP           = {};\n".format(source_values[0]))
-        header_lines.append("static constexpr int        SOURCE_TEMP_OFFSET    = {};\n".format(source_values[1]))
-        header_lines.append("static constexpr double     SOURCE_KP             = {};\n".format(source_values[2]))
-        header_lines.append("static constexpr double     SOURCE_KD             = {};\n".format(source_values[3]))
+        header_lines.append("static constexpr int        SOURCE_TEMP           = {};\n".format(values['SOURCE_TEMP']))
+        header_lines.append("static constexpr int        SOURCE_TEMP_OFFSET    = {};\n".format(values['SOURCE_TEMP_OFFSET']))
+        header_lines.append("static constexpr double     SOURCE_KP             = {};\n".format(values['SOURCE_KP']))
+        header_lines.append("static constexpr double     SOURCE_KD             = {};\n".format(values['SOURCE_KD']))
         header_lines.append("\n")
-        header_lines.append("static constexpr unsigned long DEPOSITION_TIME_MS = {};\n".format(int(parameters_entries['Additional']['Timer'].get()) * 60 * 1000))
+        header_lines.append("static constexpr unsigned long DEPOSITION_TIME_MS = {};\n".format(values['DEPOSITION_TIME_MS']))
+        return ''.join(header_lines)
+
+    @staticmethod
+    def write_to_header(header_file_path, parameters_entries) -> bool:
+        # Returns False if the header already has this content. It is left alone then, so its
+        # modification time doesn't make arduino-cli rebuild the sketch
+        header_content: str = FileManager.header_content(parameters_entries)
+        try:
+            with open(header_file_path, "r") as header_file:
+                if header_file.read() == header_content:
+                    print("Header file is up to date")
+                    return False
+        except FileNotFoundError:
+            pass
 
         # Write to the header file
         with open(header_file_path, "w") as header_file:
-            header_file.writelines(header_lines)
+            header_file.write(header_content)
 
         print("Header file has been written: \n>>>")
         with open(header_file_path, "r") as header_file:
             print(header_file.read())
         print("<<<")
+        return True
 
     # Functions to save and load data
     @staticmethod
     def save_data(data, filename):
-        # Create a copy of data with text content only
-        text_data = {k1: {k2: v2.get() for k2, v2 in v1.items()} for k1, v1 in data.items()}
-        with open(filename, 'wb') as output:
-            pickle.dump(text_data, output)
+        FileManager.write_data(FileManager.entries_text(data), filename)
+
+    @staticmethod
+    def entries_text(data):
+        # Create a copy of data with text content only, has to run on the Tk thread
+        return {k1: {k2: v2.get() for k2, v2 in v1.items()} for k1, v1 in data.items()}
+
+    @staticmethod
+    def write_data(text_data, filename):
+        # Only plain strings, safe to call from any thread
+        FileManager.write_atomic(pickle.dumps(text_data), filename)
+
+    @staticmethod
+    def write_atomic(content: bytes, filename):
+        # Readers see either the old file or the new one, never a partly written one
+        temp_filename = filename + '.tmp'
+        with open(temp_filename, 'wb') as output:
+            output.write(content)
+            output.flush()
+            os.fsync(output.fileno())
+        os.replace(temp_filename, filename)
 
     @staticmethod
     def load_data(data, filename, show_error=True, load_filenames=False):
@@ -132,18 +387,111 @@ class FileManager:
                 data[k1][k2].insert(0, v2)
 
     @staticmethod
-    def save_graph_data(input_file_path, parameters_entries):
-        output_filename:str = str(parameters_entries['Additional']['Name'].get())
-        print("Saving file to " + output_filename)
+    def export_columns(reader: FileParser):
+        # (name, values, format) of every exported channel, Index/Temp1/Temp2 first as in older exports
+        columns = [
+            ('Index',    np.arange(1, len(reader.series) + 1), '%d'),
+            ('Temp1',    reader.temp1_values,                  '%.2f'),
+            ('Temp2',    reader.temp2_values,                  '%.2f'),
+            ('Time',     reader.time_values,                   '%.4f'),
+            ('Control1', reader.control1_values,               '%d'),
+            ('Control2', reader.control2_values,               '%d'),
+        ]
+        # Whole numbers from the TRACE/TIMER lines, nan where a line was missing
+        columns += [(name.capitalize(), reader.trace_values(name), '%.0f') for name in TimeSeries.trace_columns]
+        return columns
+
+    @staticmethod
+    def write_csv(file_path, columns, chunk_rows: int = 65536):
+        # Rows are formatted a chunk at a time by one % operation, memory stays bounded for long runs
+        count: int = len(columns[0][1])
+        row_format: str = ','.join(fmt for _, _, fmt in columns) + '\n'
+        with open(file_path, 'w') as file:
+            file.write(','.join(name for name, _, _ in columns) + '\n')
+            for start in range(0, count, chunk_rows):
+                stop: int = min(start + chunk_rows, count)
+                chunk = np.column_stack([values[start:stop] for _, values, _ in columns])
+                file.write((row_format * (stop - start)) % tuple(chunk.ravel().tolist()))
+
+    @staticmethod
+    def write_npz(file_path, columns, param_str: str):
+        # Compressed, one array per channel, np.load(path)['Temp1']
+        arrays = {name: np.asarray(values) for name, values, _ in columns}
+        with open(file_path, 'wb') as file:
+            np.savez_compressed(file, Parameters=np.array(param_str), **arrays)
+
+    @staticmethod
+    def save_graph_data(input_file_path, output_filename: str, reader: Optional[FileParser] = None, file_format: str = 'csv') -> str:
+        output_path: str = f'data/{output_filename}_data.{file_format}'
+        print("Saving file to " + output_path)
 
-        reader = FileParser(input_file_path).read_file()
+        # Reuse the series the GUI already parsed, only catching up with the file tail. A parser fed by
+        # a live reader or the daemon is kept current by the pipeline, the daemon's offsets are ahead of the disk
+        if reader is None:
+            reader = FileParser(input_file_path)
+        live: bool = reader.live_reader is not None and reader.live_reader.is_alive()
+        if not live and reader.daemon_generation is None:
+            reader.read_file()
+        # In a live window view the older samples are only on disk
+        reader = reader.full_history()
 
         timer = Timer()
-        with open(f'data/{output_filename}_data.csv', 'w', newline='') as output_file:
-            writer = csv.writer(output_file)
-            writer.writerow(['Index', 'Temp1', 'Temp2'])
+        columns = FileManager.export_columns(reader)
+
+        # Written next to the target and renamed, an open export is never seen half written
+        temp_path: str = output_path + '.tmp'
+        if file_format == 'csv':
+            FileManager.write_csv(temp_path, columns)
+        elif file_format == 'npz':
+            FileManager.write_npz(temp_path, columns, reader.arduino_param_str)
+        else:
+            raise ValueError("Unknown export format: {}".format(file_format))
+        os.replace(temp_path, output_path)
 
-            for i, (temp1, temp2) in enumerate(zip(reader.temp1_values, reader.temp2_values), 1):
-                writer.writerow([i, temp1, temp2])
-        
         timer.stop("File write time")
+        return output_path
+
+
+class ParameterAutosaver:
+    # Saves the parameter entries once they stop changing. Entries are watched through the traces
+    # of their text variables, so nothing runs while the parameters are left alone
+    def __init__(self, widget, data, filename, delay_ms: int = 500,
+                 submit: Optional[Callable[[Callable[[], None]], None]] = None):
+        self.widget   = widget  # any Tk widget, schedules the debounced save
+        self.data     = data
+        self.filename = filename
+        self.delay_ms: int = delay_ms
+        # Runs the file write, e.g. on a worker thread. Writes keep their order
+        self.submit:   Callable[[Callable[[], None]], None] = submit or (lambda write: write())
+        self.pending_id: Optional[str] = None
+
+        # What is already on disk, e.g. just loaded from it
+        self.saved_hash: bytes = hashlib.sha1(pickle.dumps(FileManager.entries_text(data))).digest()
+
+        for entries in data.values():
+            for entry in entries.values():
+                variable = entry.cget('textvariable')
+                if variable is not None:
+                    variable.trace_add('write', self.on_change)
+
+    def on_change(self, *args):
+        # Every keystroke restarts the delay, a burst of typing ends in one save
+        if self.pending_id is not None:
+            self.widget.after_cancel(self.pending_id)
+        self.pending_id = self.widget.after(self.delay_ms, self.save)
+
+    def save(self):
+        self.pending_id = None
+        content: bytes = pickle.dumps(FileManager.entries_text(self.data))
+        content_hash: bytes = hashlib.sha1(content).digest()
+        if content_hash == self.saved_hash:
+            return
+        self.saved_hash = content_hash
+        filename = self.filename
+        self.submit(lambda: FileManager.write_atomic(content, filename))
+
+    def flush(self):
+        # Save a pending change right away, e.g. before the window closes
+        if self.pending_id is not None:
+            self.widget.after_cancel(self.pending_id)
+            self.save()
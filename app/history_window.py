@@ -0,0 +1,76 @@
+import numpy as np
+from typing import Dict, List
+import customtkinter as ctk
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+from CTkMessagebox import CTkMessagebox
+
+from decimation import decimate_series, point_budget
+from run_archive import ArchivedRun, RunArchive
+
+
+class HistoryWindow(ctk.CTkToplevel):
+    # Archived runs overlaid on one plot. The list comes from the index only, the samples of a run
+    # are loaded when it is ticked
+    def __init__(self, master, archive: RunArchive):
+        super().__init__(master)
+        self.title("Run history")
+        self.geometry("1500x800")
+        self.archive: RunArchive = archive
+        self.plotted: Dict[int, List] = {}
+
+        self.fig = Figure(figsize=(5, 4), dpi=100)
+        self.ax = self.fig.add_subplot(111)
+        self.ax.grid()
+        self.ax.set_xlabel('Time, min', fontsize=14)
+        self.ax.set_ylabel('Temperature, C', fontsize=14)
+        self.canvas = FigureCanvasTkAgg(self.fig, master=self)
+        self.canvas.get_tk_widget().pack(side=ctk.LEFT, fill=ctk.BOTH, expand=True)
+
+        runs_frame = ctk.CTkScrollableFrame(self, width=460)
+        runs_frame.pack(side=ctk.RIGHT, fill=ctk.Y, padx=10, pady=10)
+        for row, run in enumerate(self.archive.runs()):
+            checkbox = ctk.CTkCheckBox(runs_frame, text=run.label())
+            checkbox.configure(command=lambda run=run, checkbox=checkbox: self.show_run(run, bool(checkbox.get())))
+            checkbox.grid(row=2 * row, column=0, sticky='w', pady=(8, 0))
+            ctk.CTkLabel(runs_frame, text=self.summary(run), justify='left').grid(row=2 * row + 1, column=0, sticky='w', padx=30)
+
+        self.canvas.draw()
+
+    @staticmethod
+    def summary(run: ArchivedRun) -> str:
+        def number(value) -> str:
+            return f'{value:.1f}' if value is not None else '-'
+        return (f'{run.param_str}\n'
+                f'Median substrate {number(run.median_substrate)}°C, source {number(run.median_source)}°C\n'
+                f'Overshoot substrate {number(run.overshoot_substrate)}°C, source {number(run.overshoot_source)}°C')
+
+    def show_run(self, run: ArchivedRun, show: bool):
+        if not show:
+            for line in self.plotted.pop(run.id, []):
+                line.remove()
+        else:
+            try:
+                records = self.archive.samples(run)
+            except ValueError as error:
+                CTkMessagebox(title="Error", message=str(error))
+                return
+
+            # Substrate dashed, source solid, one color per run
+            budget: int = point_budget(self.ax.bbox.width)
+            time_values = np.ascontiguousarray(records['info'][:, 0])
+            color = f'C{len(self.plotted) % 10}'
+            lines = []
+            for column, linestyle, channel in ((1, '--', 'substrate'), (3, '-', 'source')):
+                x, y = decimate_series(time_values, np.ascontiguousarray(records['info'][:, column]), budget, 0)
+                lines += self.ax.plot(x, y, color=color, linestyle=linestyle, label=f'#{run.id} {run.name} {channel}')
+            self.plotted[run.id] = lines
+
+        self.ax.relim()
+        self.ax.autoscale_view()
+        if self.plotted:
+            self.ax.legend(fontsize=8)
+        elif self.ax.get_legend() is not None:
+            self.ax.get_legend().remove()
+        self.canvas.draw_idle()
@@ -0,0 +1,116 @@
+import heapq
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from time_series import TimeSeries
+
+
+class RunningStats:
+    # Median from two heaps and Welford's mean/variance, insert only
+    def __init__(self):
+        self.low:   List[float] = []  # max-heap of the lower half, values are negated
+        self.high:  List[float] = []  # min-heap of the upper half
+        self.count: int         = 0
+        self.mean:  float       = 0
+        self.m2:    float       = 0
+
+    def add(self, value: float):
+        if len(self.low) == 0 or value <= -self.low[0]:
+            heapq.heappush(self.low, -value)
+        else:
+            heapq.heappush(self.high, value)
+
+        # Keep the lower half equal to or one larger than the upper half
+        if len(self.low) > len(self.high) + 1:
+            heapq.heappush(self.high, -heapq.heappop(self.low))
+        elif len(self.high) > len(self.low):
+            heapq.heappush(self.low, -heapq.heappop(self.high))
+
+        self.count += 1
+        delta: float = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def extend(self, values: Sequence[float]):
+        for value in values:
+            self.add(float(value))
+
+    @property
+    def median(self) -> float:
+        if self.count == 0:
+            return float('nan')
+        if len(self.low) > len(self.high):
+            return -self.low[0]
+        return (-self.low[0] + self.high[0]) / 2
+
+    @property
+    def std(self) -> float:
+        # Population deviation, same as np.std
+        return float(np.sqrt(self.m2 / self.count)) if self.count > 0 else float('nan')
+
+
+class IntervalTracker:
+    # Sublimation interval: starts at the first source sample above the threshold and ends at the
+    # last later sample at or above it. Only samples added since the previous update are scanned.
+    # Indices are sample numbers, so they stay valid when a bounded series drops old rows
+    def __init__(self, channel: str = 'temp2', stats_channels: Sequence[str] = ('temp1', 'temp2')):
+        self.channel:        str             = channel
+        self.stats_channels: Tuple[str, ...] = tuple(stats_channels)
+        self.reset(None, None)
+
+    def reset(self, series: Optional[TimeSeries], threshold: Optional[float]):
+        self.series:     Optional[TimeSeries]    = series
+        self.threshold:  Optional[float]         = threshold
+        self.processed:  int                     = 0
+        self.left:       Optional[int]           = None
+        self.right:      Optional[int]           = None
+        self.left_time:  float                   = 0
+        self.right_time: float                   = 0
+        self.stats:      Dict[str, RunningStats] = {name: RunningStats() for name in self.stats_channels}
+
+    def update(self, series: TimeSeries, threshold: float) -> Optional[Tuple[int, int]]:
+        # Start over when the threshold changes or the data was cleared
+        first: int = series.dropped
+        count: int = first + len(series)
+        if series is not self.series or threshold != self.threshold or count < self.processed:
+            self.reset(series, threshold)
+
+        # Samples dropped before they were seen can't be looked at any more, DataPipeline.update_interval
+        # scans the full history first when that happened
+        values = series.column(self.channel)
+        times = series.column('time')
+        start: int = max(self.processed, first)
+
+        if self.left is None:
+            above = np.flatnonzero(values[start - first:] > threshold)
+            if len(above) > 0:
+                self.left = start + int(above[0])
+                self.left_time = float(times[self.left - first])
+
+        if self.left is not None:
+            search_start: int = max(self.left + 1, start)
+            at_or_above = np.flatnonzero(values[search_start - first:] >= threshold)
+            if len(at_or_above) > 0:
+                new_right: int = search_start + int(at_or_above[-1])
+
+                # Interval grows to [left, new_right), feed only the samples it gained
+                grown = slice(max((self.right if self.right is not None else self.left) - first, 0), new_right - first)
+                for name, stats in self.stats.items():
+                    stats.extend(series.column(name)[grown])
+                self.right = new_right
+                self.right_time = float(times[new_right - first])
+
+        self.processed = count
+        return self.interval
+
+    @property
+    def interval(self) -> Optional[Tuple[int, int]]:
+        if self.left is None or self.right is None:
+            return None
+        return self.left, self.right
+
+    @property
+    def interval_times(self) -> Optional[Tuple[float, float]]:
+        if self.interval is None:
+            return None
+        return self.left_time, self.right_time
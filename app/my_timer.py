@@ -1,17 +1,90 @@
-import time
+import bisect, json, time
+from contextlib import contextmanager
+from typing import Dict, List
+
+
+class Histogram:
+    # Log-spaced buckets from 1 us to ~100 s, 4 per decade. Recording is a bisect and two adds
+    bounds_ns: List[int] = [int(1000 * 10 ** (i / 4)) for i in range(33)]
+
+    def __init__(self):
+        self.counts:   List[int] = [0] * (len(self.bounds_ns) + 1)
+        self.count:    int       = 0
+        self.total_ns: int       = 0
+        self.max_ns:   int       = 0
+        self.last_ns:  int       = 0
+
+    def record(self, elapsed_ns: int):
+        self.counts[bisect.bisect_left(self.bounds_ns, elapsed_ns)] += 1
+        self.count += 1
+        self.total_ns += elapsed_ns
+        self.last_ns = elapsed_ns
+        if elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+
+    def percentile_ms(self, percentile: float) -> float:
+        # Upper bound of the bucket the percentile falls in
+        if self.count == 0:
+            return 0
+        target: float = self.count * percentile / 100
+        seen: int = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return (self.bounds_ns[i] if i < len(self.bounds_ns) else self.max_ns) / 1e6
+        return self.max_ns / 1e6
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            'count':   self.count,
+            'mean_ms': self.total_ns / self.count / 1e6 if self.count else 0,
+            'p50_ms':  self.percentile_ms(50),
+            'p95_ms':  self.percentile_ms(95),
+            'max_ms':  self.max_ns / 1e6,
+            'last_ms': self.last_ns / 1e6,
+        }
+
 
 class Timer:
-    verbose: bool = False
-    start_time: float
+    # Measures named spans with a monotonic clock and keeps a histogram per name in memory.
+    # Nothing is printed unless verbose is set
+    verbose:    bool                 = False
+    histograms: Dict[str, Histogram] = {}
+    start_time: int
 
     def start(self):
-        self.start_time = time.time()
+        self.start_time = time.perf_counter_ns()
 
     def stop(self, name):
-        end_time: float = time.time()
-        elapsed_time: float = (end_time - self.start_time) * 1000
+        elapsed_ns: int = time.perf_counter_ns() - self.start_time
+        Timer.record(name, elapsed_ns)
         if self.verbose:
-            print(f"{elapsed_time:3.0f} ms taken by {name}")
+            print(f"{elapsed_ns / 1e6:3.0f} ms taken by {name}")
 
     def __init__(self):
         self.start()
+
+    @staticmethod
+    def record(name: str, elapsed_ns: int):
+        histogram = Timer.histograms.get(name)
+        if histogram is None:
+            histogram = Timer.histograms[name] = Histogram()
+        histogram.record(elapsed_ns)
+
+    @staticmethod
+    @contextmanager
+    def span(name: str):
+        start_time: int = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            Timer.record(name, time.perf_counter_ns() - start_time)
+
+    @staticmethod
+    def summary() -> Dict[str, Dict[str, float]]:
+        return {name: histogram.summary() for name, histogram in sorted(Timer.histograms.items())}
+
+    @staticmethod
+    def dump(file_path: str):
+        with open(file_path, 'w') as file:
+            json.dump({'time': time.strftime("%Y-%m-%d %H:%M:%S"), 'spans': Timer.summary()}, file, indent=2)
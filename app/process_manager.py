@@ -1,67 +1,243 @@
-import os, subprocess
+import hashlib, os, shlex, shutil, time
+from typing import Callable, Dict, List, Optional
 
 from file_manager import FileManager
+from serial_reader import SerialReader
+from daemon_client import DaemonClient
+from run_file import RunFileWriter, run_file_path
 
 class ProcessManager:
+    serial_reader:  Optional[SerialReader] = None
+    exit_callbacks: List[Callable[[Optional[Exception]], None]] = []
+
+    # Set when an acquisition daemon owns the port, the process commands are forwarded to it then
+    daemon_client:  Optional[DaemonClient] = None
+    # Daemon status as of the last poll, polled on the pipeline thread so the Tk thread never waits for the socket
+    daemon_running: bool                   = False
+    daemon_error:   Optional[str]          = None
+    # While the daemon doesn't answer it is only tried again every daemon_retry_s
+    daemon_reachable:  bool  = True
+    daemon_retry_s:    float = 2.0
+    daemon_retry_time: float = 0
+
+    # Can point to a stub that records its arguments and creates the output files
+    arduino_cli:         str = os.environ.get('ARDUINO_CLI', '~/Arduino/env/arduino-cli')
+    fqbn:                str = 'arduino:avr:mega'
+    firmware_cache_size: int = 32
+    max_command_length:  int = 63
+
     @staticmethod
-    def start_process():
-        print("Starting background process")
-        
-        # 1. Add nessesary rights
-        command = "sudo chmod a+rw /dev/ttyACM0"
+    def add_exit_callback(callback: Callable[[Optional[Exception]], None]):
+        # Callback runs on the reader thread when the reader exits, or on the pipeline thread when
+        # the daemon reports that its reader exited. Keep it short and thread-safe
+        ProcessManager.exit_callbacks.append(callback)
+
+    @staticmethod
+    def connect_daemon(socket_path: str) -> bool:
+        # True if a daemon answers on the socket
+        if not os.path.exists(socket_path):
+            return False
+        try:
+            client = DaemonClient(socket_path)
+            ProcessManager.daemon_running = client.request({'cmd': 'status'})['running']
+        except (OSError, ValueError) as error:
+            print("Acquisition daemon is not answering:", error)
+            return False
+        print("Connected to acquisition daemon on " + socket_path)
+        ProcessManager.daemon_client = client
+        return True
+
+    @staticmethod
+    def release():
+        # When the GUI closes. A local reader is stopped, a daemon keeps acquiring
+        if ProcessManager.daemon_client is not None:
+            ProcessManager.daemon_client.close()
+            ProcessManager.daemon_client = None
+        else:
+            ProcessManager.stop_process()
+
+    @staticmethod
+    def clear_data(log_file_path):
+        # A running reader truncates the files itself, it still holds buffered bytes and records
+        if ProcessManager.daemon_client is not None:
+            ProcessManager.daemon_client.request({'cmd': 'clear'})
+        elif ProcessManager.serial_reader is None or not ProcessManager.serial_reader.clear():
+            FileManager.clear_file(log_file_path)
+
+    @staticmethod
+    def grant_port_access():
+        # The port the reader and the upload use, the daemon's --port changes it
+        command = "sudo chmod a+rw " + shlex.quote(SerialReader.default_port)
         return_value: int = os.system(command)
         if return_value != 0:
             raise ValueError("Failed to execute \"{}\", return code = {}".format(command, return_value))
+
+    @staticmethod
+    def start_process(log_file_path):
+        print("Starting background process")
+        if ProcessManager.daemon_client is not None:
+            ProcessManager.daemon_running = ProcessManager.daemon_client.request({'cmd': 'start'})['running']
+            return
+
+        if ProcessManager.is_process_running():
+            print("Reader is already running")
+            return
         
-        # 2. Start background process reading the device
-        #command = "cat -v /dev/ttyACM0 | tee -a ~/Arduino/data/data.txt"
-        command = ["bash", "-c", "cat -v /dev/ttyACM0 | tee -a ~/Arduino/data/data.txt &"]
-        subprocess.Popen(command)
+        # 1. Add nessesary rights
+        ProcessManager.grant_port_access()
+        
+        # 2. Start reader thread, it appends the device output to the log and queues the lines for the GUI
+        source = SerialReader.open_serial(SerialReader.default_port)
+        run_writer = RunFileWriter(run_file_path(log_file_path), log_file_path)
+        ProcessManager.serial_reader = SerialReader(source, log_file_path, run_writer)
+        ProcessManager.serial_reader.exit_callbacks.extend(ProcessManager.exit_callbacks)
+        ProcessManager.serial_reader.start()
 
-        # 3. Check if the process is running
+        # 3. Check if the reader is running
         if not ProcessManager.is_process_running():
             raise ValueError("Process is not running")
-            
-        
 
     @staticmethod
     def stop_process():
         print("Stopping background process")
-        try:
-            output = subprocess.check_output(f"pkill -f \"[cat] -v /dev/ttyACM0\"", shell=True)
-        except:
-            print('Failed to kill process')
+        if ProcessManager.daemon_client is not None:
+            ProcessManager.daemon_running = ProcessManager.daemon_client.request({'cmd': 'stop'})['running']
+            return
+        if ProcessManager.serial_reader is None:
+            return
+        if not ProcessManager.serial_reader.stop():
+            print('Failed to stop reader')
 
     @staticmethod
-    def is_process_running():
+    def set_parameters(values: Dict[str, str], timeout: float = 2.0) -> str:
+        # Changes parameters of the running sketch without a reflash. They last until the board
+        # resets, parameters.h still holds the values it starts with
+        if ProcessManager.daemon_client is not None:
+            return ProcessManager.daemon_client.request({'cmd': 'set', 'values': values, 'timeout': timeout})['response']
+        if not ProcessManager.is_process_running():
+            raise ValueError("Reader is not running, start it to send parameters")
+
+        # The board has a 64 byte receive buffer and doesn't read it while sending a sample,
+        # so the assignments are split into short SET lines, each waits for its answer
+        commands: List[str] = []
+        for assignment in (f"{name}={value}" for name, value in values.items()):
+            if commands and len(commands[-1]) + 1 + len(assignment) < ProcessManager.max_command_length:
+                commands[-1] += " " + assignment
+            else:
+                commands.append("SET " + assignment)
+
+        response: str = ''
+        for command in commands:
+            print("Sending \"{}\"".format(command))
+            response = ProcessManager.serial_reader.send_command(command, timeout)
+        return response
+
+    @staticmethod
+    def poll_daemon() -> bool:
+        # Pipeline thread, False while the daemon is unreachable. A reader error is handed to the
+        # exit callbacks once, like a local reader's
+        if not ProcessManager.daemon_reachable and time.monotonic() < ProcessManager.daemon_retry_time:
+            return False
         try:
-            output = subprocess.check_output(f"pgrep -f \"[cat] -v /dev/ttyACM0\"", shell=True)
-            if output.strip():
-                return True
-        except Exception as e:
+            status: Dict = ProcessManager.daemon_client.request({'cmd': 'status'})
+        except (OSError, ValueError) as error:
+            ProcessManager.daemon_lost(error)
             return False
-        return False
+        if not ProcessManager.daemon_reachable:
+            print("Acquisition daemon is answering again")
+            ProcessManager.daemon_reachable = True
+
+        ProcessManager.daemon_running = status['running']
+        if status['running']:
+            ProcessManager.daemon_error = None
+        elif status['reader_error'] is not None and status['reader_error'] != ProcessManager.daemon_error:
+            ProcessManager.daemon_error = status['reader_error']
+            for callback in ProcessManager.exit_callbacks:
+                try:
+                    callback(ValueError(status['reader_error']))
+                except Exception as error:
+                    print("Exception occured in reader exit callback:", error)
+        return True
+
+    @staticmethod
+    def daemon_lost(error: Exception):
+        # Reported once, the client reconnects when it is tried again
+        if ProcessManager.daemon_reachable:
+            print("Acquisition daemon is not answering:", error)
+        ProcessManager.daemon_reachable = False
+        ProcessManager.daemon_running = False
+        ProcessManager.daemon_retry_time = time.monotonic() + ProcessManager.daemon_retry_s
+
+    @staticmethod
+    def is_process_running():
+        # Liveness of the tracked thread, no shell or process table lookup involved. The daemon's
+        # status is the one last polled
+        if ProcessManager.daemon_client is not None:
+            return ProcessManager.daemon_running
+        return ProcessManager.serial_reader is not None and ProcessManager.serial_reader.is_alive()
     
+    @staticmethod
+    def firmware_key(sketch_dir, header_file_path, header_content: str) -> str:
+        # Hash of the sources the firmware is built from, with the header as it is about to be written
+        digest = hashlib.sha1()
+        for name in sorted(os.listdir(sketch_dir)):
+            path = os.path.join(sketch_dir, name)
+            if name == os.path.basename(header_file_path) or not os.path.isfile(path):
+                continue
+            digest.update(name.encode() + b'\0')
+            with open(path, 'rb') as file:
+                digest.update(file.read())
+        digest.update(header_content.encode())
+        return digest.hexdigest()[:16]
+
+    @staticmethod
+    def run_arduino_cli(arguments: List[str], error_message: str):
+        command: str = " ".join([ProcessManager.arduino_cli] + [shlex.quote(argument) for argument in arguments])
+        return_value: int = os.system(command)
+        if return_value != 0:
+            raise ValueError("{}, return code = {}".format(error_message, return_value))
+
+    @staticmethod
+    def prune_firmware_cache(firmware_cache_dir):
+        entries = sorted((os.path.join(firmware_cache_dir, name) for name in os.listdir(firmware_cache_dir)), key=os.path.getmtime)
+        for path in entries[:-ProcessManager.firmware_cache_size]:
+            shutil.rmtree(path, ignore_errors=True)
+
     @staticmethod
     def compile_flush_arduino(header_file_path, parameters_entries):
-        # 1. Update header file with new parameters
+        # The build directory is kept between builds, so arduino-cli only recompiles what changed and
+        # the core and libraries are built once. Firmware of every parameter set is kept, switching
+        # back to a saved profile only uploads
+        sketch_dir: str = os.path.dirname(os.path.abspath(header_file_path))
+        build_dir: str = os.path.join(os.path.dirname(sketch_dir), 'build')
+        firmware_cache_dir: str = os.path.join(build_dir, 'firmware')
+        os.makedirs(firmware_cache_dir, exist_ok=True)
+
+        header_content: str = FileManager.header_content(parameters_entries)
+        firmware_dir: str = os.path.join(firmware_cache_dir, ProcessManager.firmware_key(sketch_dir, header_file_path, header_content))
+
+        # 1. Update header file with new parameters, unchanged content is not rewritten
         print("Creating custom header")
         FileManager.write_to_header(header_file_path, parameters_entries)
 
-        # 2. Compile the code
-        print("Arduino compiling")
-        return_value: int = os.system("~/Arduino/env/arduino-cli compile --fqbn arduino:avr:mega ~/Arduino/sketch --clean")
-        if return_value != 0:
-            raise ValueError("Failed to compile code, return code = {}".format(return_value))
-        
+        # 2. Compile the code, unless this firmware was built before
+        if os.path.isdir(firmware_dir):
+            print("Using cached firmware " + firmware_dir)
+            os.utime(firmware_dir)
+        else:
+            print("Arduino compiling")
+            output_dir: str = firmware_dir + '.tmp'
+            shutil.rmtree(output_dir, ignore_errors=True)
+            ProcessManager.run_arduino_cli(['compile', '--fqbn', ProcessManager.fqbn, sketch_dir,
+                                            '--build-path', os.path.join(build_dir, 'sketch'),
+                                            '--output-dir', output_dir], "Failed to compile code")
+            os.replace(output_dir, firmware_dir)
+            ProcessManager.prune_firmware_cache(firmware_cache_dir)
+
         # 3. Add nessesary rights
-        command = "sudo chmod a+rw /dev/ttyACM0"
-        return_value: int = os.system(command)
-        if return_value != 0:
-            raise ValueError("Failed to execute \"{}\", return code = {}".format(command, return_value))
+        ProcessManager.grant_port_access()
 
         # 4. Flush the Arduino
         print("Arduino flushing")
-        return_value: int = os.system("~/Arduino/env/arduino-cli upload ~/Arduino/sketch --fqbn arduino:avr:mega --port /dev/ttyACM0 --verbose")
-        if return_value != 0:
-            raise ValueError("Failed to flush Arduino, return code = {}".format(return_value))
+        ProcessManager.run_arduino_cli(['upload', sketch_dir, '--fqbn', ProcessManager.fqbn, '--port', SerialReader.default_port,
+                                        '--input-dir', firmware_dir, '--verbose'], "Failed to flush Arduino")
@@ -0,0 +1,133 @@
+import os, re, sqlite3, time
+from contextlib import contextmanager
+import numpy as np
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+from file_manager import FileParser
+from interval_stats import IntervalTracker
+from run_file import RunFileWriter, read_run_file
+
+# Finished runs are kept as run files in data/archive/<id>.run, with their parameters and summary
+# statistics in an SQLite index next to them. Listing runs only reads the index, samples are
+# memory mapped from the run file when a run is plotted
+
+
+class ArchivedRun(NamedTuple):
+    id:                   int
+    name:                 str
+    archived_at:          str
+    param_str:            str
+    samples:              int
+    duration_min:         float
+    sublimation_s:        Optional[int]
+    median_substrate:     Optional[float]
+    median_source:        Optional[float]
+    overshoot_substrate:  Optional[float]  # max temperature above the set point (target + offset), °C
+    overshoot_source:     Optional[float]
+    run_path:             str
+
+    def label(self) -> str:
+        sublimation: str = f'{self.sublimation_s // 60}m {self.sublimation_s % 60}s' if self.sublimation_s is not None else 'None'
+        return f'#{self.id} {self.name} {self.archived_at}, {self.duration_min:.0f} min, sublimation {sublimation}'
+
+
+# "Substrate: T=(460+15) ...; Source: T=(460+15) ..." from the START line
+SET_POINT_PATTERN = re.compile(r'(Substrate|Source): T=\(\s*(-?\d+)\s*\+\s*(-?\d+)\)')
+
+
+def set_points(param_str: str) -> Tuple[Optional[int], Optional[int]]:
+    # Target plus offset of substrate and source, what the controllers drive the reading to
+    points = {name: int(target) + int(offset) for name, target, offset in SET_POINT_PATTERN.findall(param_str)}
+    return points.get('Substrate'), points.get('Source')
+
+
+class RunArchive:
+    schema: str = '''
+        CREATE TABLE IF NOT EXISTS runs (
+            id                  INTEGER PRIMARY KEY AUTOINCREMENT,
+            name                TEXT NOT NULL,
+            archived_at         TEXT NOT NULL,
+            param_str           TEXT NOT NULL,
+            samples             INTEGER NOT NULL,
+            duration_min        REAL NOT NULL,
+            sublimation_s       INTEGER,
+            median_substrate    REAL,
+            median_source       REAL,
+            overshoot_substrate REAL,
+            overshoot_source    REAL,
+            run_path            TEXT NOT NULL
+        )'''
+
+    def __init__(self, directory: str = 'data/archive'):
+        self.directory: str = directory
+        os.makedirs(directory, exist_ok=True)
+        self.db_path: str = os.path.join(directory, 'index.sqlite')
+        with self.connect() as connection:
+            connection.execute(self.schema)
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        # A connection per call, the archive is used from the pipeline thread and from the Tk thread.
+        # Commits when the block succeeds
+        connection = sqlite3.connect(self.db_path)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def archive(self, reader: FileParser, name: str, interval_temp: Optional[float]) -> Optional[int]:
+        # Stores the parsed run, returns its id or None if there was nothing to keep
+        reader = reader.full_history()
+        count: int = len(reader.series)
+        if count == 0:
+            return None
+
+        sublimation_s: Optional[int] = None
+        medians: List[Optional[float]] = [None, None]
+        if interval_temp is not None:
+            tracker = IntervalTracker()
+            interval = tracker.update(reader.series, interval_temp)
+            if interval is not None:
+                sublimation_s = interval[1] - interval[0]
+                medians = [tracker.stats['temp1'].median, tracker.stats['temp2'].median]
+
+        overshoots: List[Optional[float]] = []
+        for set_point, values in zip(set_points(reader.arduino_param_str), (reader.temp1_values, reader.temp2_values)):
+            overshoots.append(max(float(values.max()) - set_point, 0.0) if set_point is not None else None)
+
+        with self.connect() as connection:
+            cursor = connection.execute(
+                'INSERT INTO runs (name, archived_at, param_str, samples, duration_min, sublimation_s, median_substrate,'
+                ' median_source, overshoot_substrate, overshoot_source, run_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (name, time.strftime("%Y-%m-%d %H:%M"), reader.arduino_param_str, count, reader.max_time_value,
+                 sublimation_s, *medians, *overshoots, ''))
+            run_id: int = cursor.lastrowid
+
+            # Samples in the run file format, written before the index row is committed
+            run_path: str = os.path.join(self.directory, f'{run_id}.run')
+            if os.path.exists(run_path):
+                # Left over from an insert that was rolled back, the id is used again
+                os.remove(run_path)
+            writer = RunFileWriter(run_path)
+            writer.param_str = reader.arduino_param_str
+            writer.extend(reader.series.table(), reader.trace_series.table(), 0)
+            writer.close()
+            connection.execute('UPDATE runs SET run_path = ? WHERE id = ?', (run_path, run_id))
+
+        print(f"Archived {count} samples as run #{run_id}")
+        return run_id
+
+    def runs(self) -> List[ArchivedRun]:
+        # Newest first, only the index is read
+        with self.connect() as connection:
+            rows = connection.execute(f'SELECT {", ".join(ArchivedRun._fields)} FROM runs ORDER BY id DESC').fetchall()
+        return [ArchivedRun(*row) for row in rows]
+
+    def samples(self, run: ArchivedRun) -> np.ndarray:
+        # Memory mapped records, records['info'] columns are TimeSeries.info_columns
+        loaded = read_run_file(run.run_path)
+        if loaded is None:
+            raise ValueError("Run file \"{}\" is missing".format(run.run_path))
+        return loaded[2]
+
@@ -0,0 +1,240 @@
+import hashlib, os, struct, sys
+import numpy as np
+from typing import Optional, Tuple
+
+from time_series import TimeSeries
+
+# Binary run file written next to the text log (data/data.txt -> data/data.run).
+#
+# Header, HEADER_SIZE bytes:
+#   magic (8s) | version (u4) | column count (u4) | text log offset (u8) | parameter string length (u4)
+#   | fingerprint length (u4) | fingerprint (20s) | START: parameter string, utf-8, zero padded
+# Records follow: little-endian float64 per TimeSeries.info_columns entry, then float32 per
+# TimeSeries.trace_columns entry. The text log offset says where in the text log the first
+# sample that is not in the records starts. The fingerprint is the sha1 of the first bytes of
+# the text log, a log rewritten outside the app doesn't match its old run file any more.
+# Version 2 files have no fingerprint, they are still read but never taken for a log.
+
+MAGIC:         bytes = b'ARDRUN\0\0'
+VERSION:       int   = 3
+HEADER_SIZE:   int   = 512
+HEADER_FORMAT: str   = '<8sIIQII20s'
+LEGACY_HEADER_FORMAT: str = '<8sIIQI'
+PARAMS_OFFSET: int   = struct.calcsize(HEADER_FORMAT)
+PARAMS_SIZE:   int   = HEADER_SIZE - PARAMS_OFFSET
+TEXT_OFFSET_POSITION: int = struct.calcsize('<8sII')
+COLUMNS:       Tuple[str, ...] = TimeSeries.info_columns + TimeSeries.trace_columns
+RECORD_DTYPE:  np.dtype = np.dtype([('info', '<f8', len(TimeSeries.info_columns)), ('trace', '<f4', len(TimeSeries.trace_columns))])
+RECORD_SIZE:   int   = RECORD_DTYPE.itemsize
+FINGERPRINT_SIZE: int = 4096
+
+
+def run_file_path(text_log_path: str) -> str:
+    return os.path.splitext(text_log_path)[0] + '.run'
+
+
+def log_fingerprint(text_log_path: str, size: int) -> Tuple[int, bytes]:
+    # (length, sha1) of the first size bytes of the log, shorter if the log is
+    with open(text_log_path, 'rb') as file:
+        data: bytes = file.read(size)
+    return len(data), hashlib.sha1(data).digest()
+
+
+EMPTY_FINGERPRINT: Tuple[int, bytes] = (0, hashlib.sha1(b'').digest())
+
+
+def pack_header(param_str: str, text_offset: int, fingerprint: Tuple[int, bytes] = EMPTY_FINGERPRINT) -> bytes:
+    params: bytes = param_str.encode()[:PARAMS_SIZE]
+    header: bytes = struct.pack(HEADER_FORMAT, MAGIC, VERSION, len(COLUMNS), text_offset, len(params), *fingerprint) + params
+    return header.ljust(HEADER_SIZE, b'\0')
+
+
+class RunFileWriter:
+    # Appends records in batches. If the file gets truncated (data cleared) the header is
+    # written again and the time column restarts from zero, same as the text parser does.
+    # text_log_path is the log the records come from, None for a run file without one (archive)
+    def __init__(self, path: str, text_log_path: Optional[str] = None):
+        self.path:         str        = path
+        self.text_log_path: Optional[str] = text_log_path
+        self.fingerprint:  Tuple[int, bytes] = EMPTY_FINGERPRINT
+        self.fd:           int        = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self.param_str:    str        = 'No data'
+        self.params_dirty: bool       = False
+        self.pending:      np.ndarray = np.empty(0, dtype=RECORD_DTYPE)
+        self.pending_size: int        = 0
+
+    def set_params(self, param_str: str):
+        self.param_str = param_str
+        self.params_dirty = True
+
+    def append_parsed(self, parsed):
+        # Rows from FileParser.tokenize_lines. Time is assigned on flush
+        if parsed.param_str is not None:
+            self.set_params(parsed.param_str)
+
+        if parsed.leading_trace is not None and self.pending_size > 0:
+            # TRACE/TIMER lines of the last pending record
+            last = self.pending[self.pending_size - 1]['trace']
+            leading = np.array(parsed.leading_trace, dtype=last.dtype)
+            last[~np.isnan(leading)] = leading[~np.isnan(leading)]
+
+        count: int = len(parsed.info_rows)
+        if count == 0:
+            return
+        if self.pending_size + count > len(self.pending):
+            self.pending = np.resize(self.pending, max(2 * len(self.pending), self.pending_size + count, 64))
+        records = self.pending[self.pending_size:self.pending_size + count]
+        records['info'] = parsed.info_rows
+        records['trace'] = parsed.trace_rows
+        self.pending_size += count
+
+    def sync(self, log_end: int):
+        # Records for the log text before log_end the run file doesn't cover yet, e.g. appended by
+        # ard_read or logged before the run file existed. Without them the parser would take the
+        # records written from now on for the whole run
+        from file_manager import FileParser
+
+        run = read_run_file(self.path, self.text_log_path)
+        text_offset: int = run[1] if run is not None else 0
+        if run is None or text_offset > log_end:
+            # Missing, unreadable, of another log or ahead of it, built again from the start of the log
+            os.ftruncate(self.fd, 0)
+            text_offset = 0
+        else:
+            self.param_str = run[0]
+        if text_offset == log_end:
+            return
+
+        print(f"Adding the log from byte {text_offset} to \"{self.path}\"")
+        with open(self.text_log_path, 'rb') as file:
+            file.seek(text_offset)
+            chunk: bytes = file.read(log_end - text_offset)
+        end: int = chunk.rfind(b'\n') + 1
+        self.append_parsed(FileParser.tokenize_lines(chunk[:end].decode(errors='replace').splitlines(keepends=True)))
+        self.flush(text_offset + end)
+
+    def update_fingerprint(self, text_offset: int):
+        # Grows with the log until FINGERPRINT_SIZE bytes are covered, the log is flushed up to text_offset
+        size: int = min(text_offset, FINGERPRINT_SIZE)
+        if self.text_log_path is not None and self.fingerprint[0] < size:
+            self.fingerprint = log_fingerprint(self.text_log_path, size)
+            self.params_dirty = True
+
+    def write_header_if_empty(self, text_offset: int) -> int:
+        size: int = os.lseek(self.fd, 0, os.SEEK_END)
+        if size < HEADER_SIZE:
+            os.ftruncate(self.fd, 0)
+            os.pwrite(self.fd, pack_header(self.param_str, text_offset, self.fingerprint), 0)
+            size = HEADER_SIZE
+            self.params_dirty = False
+        return size
+
+    def flush(self, text_offset: int, hold_last: bool = False):
+        # With hold_last the newest record stays pending, its TRACE lines may still be on the way.
+        # text_offset then has to point at the start of its INFO line
+        self.update_fingerprint(text_offset)
+        size: int = self.write_header_if_empty(text_offset)
+        if self.params_dirty:
+            os.pwrite(self.fd, pack_header(self.param_str, text_offset, self.fingerprint), 0)
+            self.params_dirty = False
+
+        count: int = self.pending_size - 1 if hold_last and self.pending_size > 0 else self.pending_size
+        if count > 0:
+            # Writing at the record boundary overwrites a torn record from an interrupted write
+            first_index: int = (size - HEADER_SIZE) // RECORD_SIZE
+            records = self.pending[:count]
+            records['info'][:, 0] = (first_index + np.arange(count)) / 60
+            os.pwrite(self.fd, records.tobytes(), HEADER_SIZE + first_index * RECORD_SIZE)
+
+            self.pending[:self.pending_size - count] = self.pending[count:self.pending_size]
+            self.pending_size -= count
+
+        os.pwrite(self.fd, struct.pack('<Q', text_offset), TEXT_OFFSET_POSITION)
+
+    def clear(self):
+        # Data cleared, records not written yet are dropped and the next flush starts a new file
+        self.pending_size = 0
+        self.fingerprint = EMPTY_FINGERPRINT
+        os.ftruncate(self.fd, 0)
+
+    def extend(self, info: np.ndarray, trace: np.ndarray, text_offset: int):
+        # Whole rows including time, used by the converter
+        self.update_fingerprint(text_offset)
+        size: int = self.write_header_if_empty(text_offset)
+        first_index: int = (size - HEADER_SIZE) // RECORD_SIZE
+        records = np.empty(len(info), dtype=RECORD_DTYPE)
+        records['info'] = info
+        records['trace'] = trace
+        os.pwrite(self.fd, records.tobytes(), HEADER_SIZE + first_index * RECORD_SIZE)
+        os.pwrite(self.fd, pack_header(self.param_str, text_offset, self.fingerprint), 0)
+
+    def close(self):
+        os.close(self.fd)
+
+
+def read_run_file(path: str, text_log_path: Optional[str] = None) -> Optional[Tuple[str, int, np.ndarray]]:
+    # Returns (parameter string, text log offset, memory mapped records), records['info'] and
+    # records['trace'] are (count, columns) arrays. With text_log_path None is returned unless the
+    # run file was written from that log
+    try:
+        with open(path, 'rb') as file:
+            header: bytes = file.read(HEADER_SIZE)
+            size: int = os.fstat(file.fileno()).st_size
+    except FileNotFoundError:
+        return None
+
+    if len(header) < HEADER_SIZE:
+        return None
+    magic, version, columns = struct.unpack_from('<8sII', header)
+    if magic != MAGIC or version not in (2, VERSION) or columns != len(COLUMNS):
+        print(f"Unsupported run file \"{path}\"")
+        return None
+    if version == VERSION:
+        _, _, _, text_offset, params_length, *fingerprint = struct.unpack_from(HEADER_FORMAT, header)
+        params_offset: int = PARAMS_OFFSET
+    else:
+        _, _, _, text_offset, params_length = struct.unpack_from(LEGACY_HEADER_FORMAT, header)
+        params_offset = struct.calcsize(LEGACY_HEADER_FORMAT)
+        fingerprint = None
+    param_str: str = header[params_offset:params_offset + params_length].decode(errors='replace')
+
+    if text_log_path is not None and (fingerprint is None or log_fingerprint(text_log_path, fingerprint[0]) != tuple(fingerprint)):
+        print(f"Run file \"{path}\" doesn't belong to \"{text_log_path}\"")
+        return None
+
+    count: int = (size - HEADER_SIZE) // RECORD_SIZE
+    if count == 0:
+        return param_str, text_offset, np.empty(0, dtype=RECORD_DTYPE)
+    records = np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER_SIZE, shape=(count,))
+    return param_str, text_offset, records
+
+
+def clear_run_file(text_log_path: str):
+    path: str = run_file_path(text_log_path)
+    if os.path.exists(path):
+        with open(path, 'wb') as file:
+            file.truncate(0)
+
+
+def convert_text_log(text_log_path: str, output_path: Optional[str] = None) -> str:
+    # Build a run file from an existing text log
+    from file_manager import FileParser
+
+    output_path = output_path or run_file_path(text_log_path)
+    reader = FileParser(text_log_path, use_run_file=False).read_file()
+
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    writer = RunFileWriter(output_path, text_log_path)
+    writer.param_str = reader.arduino_param_str
+    writer.extend(reader.series.table(), reader.trace_series.table(), reader.file_offset)
+    writer.close()
+    print(f"Converted {len(reader.series)} samples from \"{text_log_path}\" to \"{output_path}\"")
+    return output_path
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (2, 3):
+        print(f"Usage: python3 {sys.argv[0]} <data.txt> [output.run]")
+        sys.exit(1)
+    convert_text_log(*sys.argv[1:])
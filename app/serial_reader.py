@@ -0,0 +1,207 @@
+import os, queue, select, threading, time
+from typing import Callable, List, Optional
+
+from file_manager import FileManager, FileParser, ParsedLines
+from run_file import RunFileWriter
+
+
+class FdSource:
+    # Byte source reading from a raw file descriptor (tty, pty), mirrors pyserial's read() with timeout
+    def __init__(self, fd: int, timeout: float = 0.1):
+        self.fd:      int   = fd
+        self.timeout: float = timeout
+
+    def read(self, size: int) -> bytes:
+        ready, _, _ = select.select([self.fd], [], [], self.timeout)
+        if not ready:
+            return b''
+        try:
+            data: bytes = os.read(self.fd, size)
+        except OSError as error:
+            # Reading the master side of a pty whose slave was closed raises EIO
+            raise EOFError(f"Source closed: {error}")
+        if not data:
+            raise EOFError("Source closed")
+        return data
+
+    def write(self, data: bytes) -> int:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self.fd, view):]
+        return len(data)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class SerialReader(threading.Thread):
+    default_port:   str   = '/dev/ttyACM0'
+    baudrate:       int   = 9600
+    read_size:      int   = 4096
+    flush_interval: float = 1.0
+
+    # Answers of the sketch to commands, see Reactor::handleCommand
+    response_prefixes: tuple = (b'OK ', b'ERR ')
+
+    # Source is anything with read(size) -> bytes that returns b'' on timeout, write(data) and close(),
+    # e.g. serial.Serial, FdSource or a fake stream
+    def __init__(self, source, log_file_path: str, run_writer: Optional[RunFileWriter] = None):
+        super().__init__(name="SerialReader", daemon=True)
+        self.source                                 = source
+        self.log_file_path: str                     = log_file_path
+        self.lines:         queue.Queue             = queue.Queue()
+        self.stop_event:    threading.Event         = threading.Event()
+        self.error:         Optional[Exception]     = None
+
+        # Commands are written from other threads, answers are queued here besides the log
+        self.write_lock:    threading.Lock          = threading.Lock()
+        self.responses:     queue.Queue             = queue.Queue()
+
+        # Clears wait here for the reader thread, which owns the log and the run file
+        self.clear_requests: queue.Queue            = queue.Queue()
+
+        # Called from the reader thread once it has exited, with the error that stopped it (if any)
+        self.exit_callbacks: List[Callable[[Optional[Exception]], None]] = []
+
+        # Binary copy of the INFO records, flushed together with the text log
+        self.run_writer:    Optional[RunFileWriter] = run_writer
+        self.bytes_since_info: int                  = 0
+
+        # Everything before this offset was already in the log when the reader started
+        self.log_file = open(self.log_file_path, 'ab', buffering=64 * 1024)
+        self.start_offset: int = os.fstat(self.log_file.fileno()).st_size
+        if self.run_writer is not None:
+            self.run_writer.sync(self.start_offset)
+
+    @staticmethod
+    def open_serial(port: str = default_port, baudrate: int = baudrate):
+        # pyserial is only needed when talking to the real board
+        import serial
+        return serial.Serial(port, baudrate, timeout=0.1)
+
+    def run(self):
+        pending: bytes = b''
+        last_flush: float = time.monotonic()
+        try:
+            while not self.stop_event.is_set():
+                while not self.clear_requests.empty():
+                    pending = b''
+                    self.clear_files()
+                    self.clear_requests.get_nowait().set()
+
+                data: bytes = self.source.read(self.read_size)
+                if data:
+                    pending += data
+
+                    # Frame complete lines, the incomplete tail waits for the next read
+                    end: int = pending.rfind(b'\n') + 1
+                    if end > 0:
+                        complete, pending = pending[:end], pending[end:]
+                        self.log_file.write(complete)
+                        for line in complete.splitlines(keepends=True):
+                            self.lines.put(line)
+                            if line.startswith(self.response_prefixes):
+                                self.responses.put(line)
+                        if self.run_writer is not None:
+                            self.record_lines(complete)
+
+                if time.monotonic() - last_flush >= self.flush_interval:
+                    self.flush()
+                    last_flush = time.monotonic()
+        except Exception as error:
+            print("Serial reader stopped with error:", error)
+            self.error = error
+        finally:
+            self.flush(final=True)
+            self.log_file.close()
+            if self.run_writer is not None:
+                self.run_writer.close()
+            try:
+                self.source.close()
+            except Exception as error:
+                print("Failed to close serial source:", error)
+
+            for callback in self.exit_callbacks:
+                try:
+                    callback(self.error)
+                except Exception as error:
+                    print("Exception occured in reader exit callback:", error)
+
+    def clear(self, timeout: float = 2.0) -> bool:
+        # Truncates the log and the run file between two reads, so nothing buffered or pending from
+        # before ends up in the new data. False if the reader is gone, the caller clears the files then
+        if not self.is_alive():
+            return False
+        done: threading.Event = threading.Event()
+        self.clear_requests.put(done)
+        return done.wait(timeout)
+
+    def clear_files(self):
+        # Reader thread. Closing writes the buffered bytes, the truncation then drops them with the rest
+        self.log_file.close()
+        FileManager.clear_file(self.log_file_path)
+        self.log_file = open(self.log_file_path, 'ab', buffering=64 * 1024)
+        self.start_offset = 0
+        self.bytes_since_info = 0
+        if self.run_writer is not None:
+            self.run_writer.clear()
+        # Lines nobody took yet belong to the cleared data, the queue now starts at offset 0 of the log
+        self.get_lines()
+
+    def record_lines(self, complete: bytes):
+        parsed: ParsedLines = FileParser.tokenize_lines(complete.decode(errors='replace').splitlines(keepends=True))
+        self.run_writer.append_parsed(parsed)
+
+        # Bytes from the start of the newest INFO line to the end of the log
+        if parsed.info_rows:
+            info_start: int = complete.rfind(b'\nINFO: ') + 1
+            self.bytes_since_info = len(complete) - info_start
+        else:
+            self.bytes_since_info += len(complete)
+
+    def flush(self, final: bool = False):
+        self.log_file.flush()
+        if self.run_writer is not None:
+            # After a flush the append-mode position is the end of the log, even if it was truncated meanwhile.
+            # The newest sample is held back until the run ends, its TRACE lines may not be complete yet
+            log_end: int = self.log_file.tell()
+            if final:
+                self.run_writer.flush(log_end)
+            else:
+                self.run_writer.flush(max(log_end - self.bytes_since_info, 0), hold_last=True)
+
+    def send_command(self, command: str, timeout: float = 2.0) -> str:
+        # Writes one command line and waits for its answer, raises ValueError on ERR or timeout
+        if not self.is_alive():
+            raise ValueError("Reader is not running")
+
+        # Answers nobody waited for
+        while not self.responses.empty():
+            self.responses.get_nowait()
+
+        with self.write_lock:
+            self.source.write(command.encode() + b'\n')
+        try:
+            response: str = self.responses.get(timeout=timeout).decode(errors='replace').rstrip()
+        except queue.Empty:
+            raise ValueError("No answer to \"{}\" within {} s".format(command, timeout))
+        if not response.startswith('OK'):
+            raise ValueError("Command \"{}\" failed: {}".format(command, response))
+        return response
+
+    def stop(self, timeout: float = 1.0) -> bool:
+        # Returns True if the thread has finished, the log is flushed and the port released
+        self.stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+        return not self.is_alive()
+
+    def get_lines(self) -> List[bytes]:
+        # Drain all framed lines without blocking
+        lines: List[bytes] = []
+        try:
+            while True:
+                lines.append(self.lines.get_nowait())
+        except queue.Empty:
+            pass
+        return lines
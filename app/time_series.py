@@ -0,0 +1,105 @@
+import itertools
+import numpy as np
+from typing import Dict, Optional, Sequence, Tuple
+
+
+class TimeSeries:
+    # Columns of the INFO line, in the order they are appended
+    info_columns: Tuple[str, ...] = ('time', 'temp1', 'control1', 'temp2', 'control2')
+
+    # TRACE lines of both controllers and the TIMER line, one row per INFO sample, NaN until received.
+    # timer_state: 0 off, 1 started, 2 ended; timer_left in seconds
+    trace_terms:   Tuple[str, ...] = ('err', 'p', 'd', 'ucv', 'cv', 't')
+    trace_columns: Tuple[str, ...] = tuple(f'{term}{controller}' for controller, term in itertools.product((1, 2), trace_terms)) + ('timer_state', 'timer_left')
+
+    def __init__(self, columns: Sequence[str] = info_columns, capacity: int = 4096, dtype=np.float64,
+                 max_size: Optional[int] = None):
+        self.columns:      Tuple[str, ...]  = tuple(columns)
+        self.column_index: Dict[str, int]   = {name: i for i, name in enumerate(self.columns)}
+        self.size:         int              = 0
+
+        # With max_size only the newest rows are kept. Rows dropped from the front are counted,
+        # row i is sample number dropped + i
+        self.max_size:     Optional[int]    = max_size
+        self.dropped:      int              = 0
+
+        # One row per channel, so every channel is a contiguous slice and can be viewed without copying
+        self.data: np.ndarray = np.empty((len(self.columns), max(capacity, 1)), dtype=dtype)
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def capacity(self) -> int:
+        return self.data.shape[1]
+
+    def reserve(self, capacity: int):
+        if capacity <= self.capacity:
+            return
+        data = np.empty((len(self.columns), capacity), dtype=self.data.dtype)
+        data[:, :self.size] = self.data[:, :self.size]
+        self.data = data
+
+    def make_room(self, count: int):
+        if self.size + count <= self.capacity:
+            return
+        if self.max_size is not None and self.capacity >= 2 * self.max_size:
+            # Bounded and full, the newest rows move to the front. With twice max_size of
+            # capacity that happens once per max_size rows, so appends stay amortized O(1)
+            self.drop_front(self.size + count - self.max_size)
+            if self.size + count <= self.capacity:
+                return
+        self.reserve(max(self.capacity * 2, self.size + count))
+
+    def drop_front(self, count: int):
+        count = min(count, self.size)
+        if count <= 0:
+            return
+        self.data[:, :self.size - count] = self.data[:, count:self.size]
+        self.size -= count
+        self.dropped += count
+
+    def set_max_size(self, max_size: Optional[int]):
+        # Trims to the newest max_size rows and gives the memory of the rest back
+        self.max_size = max_size
+        if max_size is None:
+            return
+        self.drop_front(self.size - max_size)
+        if self.capacity > 2 * max_size:
+            data = np.empty((len(self.columns), max(2 * max_size, 1)), dtype=self.data.dtype)
+            data[:, :self.size] = self.data[:, :self.size]
+            self.data = data
+
+    def prepend(self, rows: np.ndarray):
+        # Rows that were dropped before, e.g. read back from disk. rows has shape (count, len(columns))
+        count: int = len(rows)
+        data = np.empty((len(self.columns), max(self.capacity, self.size + count)), dtype=self.data.dtype)
+        data[:, :count] = np.asarray(rows).T
+        data[:, count:count + self.size] = self.data[:, :self.size]
+        self.data = data
+        self.size += count
+        self.dropped = max(self.dropped - count, 0)
+
+    def extend(self, rows: np.ndarray):
+        # rows has shape (count, len(columns))
+        count: int = len(rows)
+        if self.max_size is not None and count > self.max_size:
+            # Only the tail can be kept, e.g. a long run file loaded into a bounded series
+            self.dropped += self.size + count - self.max_size
+            self.size = 0
+            rows = rows[count - self.max_size:]
+            count = self.max_size
+        self.make_room(count)
+        self.data[:, self.size:self.size + count] = np.asarray(rows).T
+        self.size += count
+
+    def column(self, name: str) -> np.ndarray:
+        # View into the store, valid until the next append that grows or shifts the buffer
+        return self.data[self.column_index[name], :self.size]
+
+    def last(self, name: str, default: float = 0) -> float:
+        return float(self.data[self.column_index[name], self.size - 1]) if self.size > 0 else default
+
+    def table(self) -> np.ndarray:
+        # (size, columns) view, e.g. for exporting rows
+        return self.data[:, :self.size].T
@@ -1,5 +1,8 @@
 #include <MAX6675_Thermocouple.h>
 #include <assert.h>
+#include <ctype.h>
+#include <limits.h>
+#include <math.h>
 
 // ##### USER SET VARIABLES
 #include "parameters.h"
@@ -90,6 +93,21 @@ public:
         digitalWrite(relayControlPin, relayState ? HIGH : LOW);
     }
 
+    /**
+     * @brief Change the set point and gains while running, the controller state is kept
+     */
+    void setParameters(int newTargetTemp, int newTempOffset, double newKp, double newKd) {
+        targetTemp = newTargetTemp;
+        tempOffet = newTempOffset;
+        kp = newKp;
+        kd = newKd;
+    }
+
+    int getTargetTemp() const { return targetTemp; }
+    int getTempOffset() const { return (int)tempOffet; }
+    double getKp() const { return kp; }
+    double getKd() const { return kd; }
+
 private:
     /**
      * @brief Calculate the average temperature from the stored readings
@@ -132,9 +150,10 @@ private:
     // Logic
     int controlValue = 0; // [0..1000], represents how ms in seconds relay will be ON
     double previousError = 0;
-    const int targetTemp;
-    const double tempOffet;
-    const double kp, kd;
+    // Set from parameters.h on reset, can be changed over serial with SET
+    int targetTemp;
+    double tempOffet;
+    double kp, kd;
 
     // Thermocouple
     double readings[NUM_TEMP_READS] = { 0 };
@@ -173,9 +192,11 @@ public:
             , "START: Substrate: T=(%3d+%2d) PD=(%d.%02d,%d.%02d); "
                 "Source: T=(%3d+%2d) PD=(%d.%02d,%d.%02d); " 
                 "TIMER: %lus\n\n"
-            , SUBSTRATE_TEMP, SUBSTRATE_TEMP_OFFSET, ip(SUBSTRATE_KP), fp(SUBSTRATE_KP), ip(SUBSTRATE_KD), fp(SUBSTRATE_KD)
-            , SOURCE_TEMP, SOURCE_TEMP_OFFSET, ip(SOURCE_KP), fp(SOURCE_KP), ip(SOURCE_KD), fp(SOURCE_KD)
-            , DEPOSITION_TIME_MS / 1000);
+            , substrateController.getTargetTemp(), substrateController.getTempOffset()
+            , ip(substrateController.getKp()), fp(substrateController.getKp()), ip(substrateController.getKd()), fp(substrateController.getKd())
+            , sourceController.getTargetTemp(), sourceController.getTempOffset()
+            , ip(sourceController.getKp()), fp(sourceController.getKp()), ip(sourceController.getKd()), fp(sourceController.getKd())
+            , depositionTimeMs / 1000);
         assert(pos < serialBufLen);
         Serial.write(serialBuf, pos);
         Serial.flush(); 
@@ -187,6 +208,8 @@ public:
     void loop() {
         currentTime = millis();
 
+        pollCommands();
+
         if(currentTime >= nextReadTime) {
             nextReadTime += TEMP_READ_INTERVAL;
             
@@ -199,9 +222,9 @@ public:
 
 #if ENABLE_TIMER
                 if (timerState == TimerState::OFF) {
-                    if (sourceController.temperature + 5 >= SOURCE_TEMP && abs(sourceController.deriv) < 50) {
+                    if (sourceController.temperature + 5 >= sourceController.getTargetTemp() && abs(sourceController.deriv) < 50) {
                         depositionStartTime = currentTime;
-                        depositionEndTime = currentTime + DEPOSITION_TIME_MS;
+                        depositionEndTime = currentTime + depositionTimeMs;
                         timerState = TimerState::STARTED;
                     }
                 } else if (timerState == TimerState::STARTED) {
@@ -223,6 +246,137 @@ public:
         }
     }
 
+    /**
+     * @brief Collect bytes of a command line from the host, runs it once the newline arrives
+     */
+    void pollCommands() {
+        while (Serial.available() > 0) {
+            char c = (char)Serial.read();
+            if (c == '\n' || c == '\r') {
+                if (commandLen > 0 && !commandOverflow) {
+                    commandBuf[commandLen] = '\0';
+                    handleCommand(commandBuf);
+                }
+                commandLen = 0;
+                commandOverflow = false;
+            } else if (commandOverflow) {
+                continue;
+            } else if (commandLen < commandBufLen - 1) {
+                commandBuf[commandLen++] = c;
+            } else {
+                // Too long, drop it and ignore everything up to the next line
+                commandLen = 0;
+                commandOverflow = true;
+                Serial.print("ERR line too long\n");
+            }
+        }
+    }
+
+    /**
+     * @brief "SET NAME=VALUE NAME=VALUE ..." with the names of parameters.h. All values are
+     * checked before any is applied. Answers "OK SET" followed by a new START line, or "ERR <reason>".
+     * Lines should stay below 64 bytes, the receive buffer isn't read while sendData flushes
+     */
+    void handleCommand(char* line) {
+        char* token = strtok(line, " ");
+        if (token == nullptr || strcmp(token, "SET") != 0) {
+            Serial.print("ERR unknown command\n");
+            return;
+        }
+
+        int substrateTemp = substrateController.getTargetTemp(), substrateOffset = substrateController.getTempOffset();
+        double substrateKp = substrateController.getKp(), substrateKd = substrateController.getKd();
+        int sourceTemp = sourceController.getTargetTemp(), sourceOffset = sourceController.getTempOffset();
+        double sourceKp = sourceController.getKp(), sourceKd = sourceController.getKd();
+        unsigned long newDepositionTimeMs = depositionTimeMs;
+
+        while ((token = strtok(nullptr, " ")) != nullptr) {
+            char* value = strchr(token, '=');
+            if (value == nullptr) {
+                Serial.print("ERR expected NAME=VALUE\n");
+                return;
+            }
+            *value++ = '\0';
+
+            bool valid;
+            if      (strcmp(token, "SUBSTRATE_TEMP") == 0)        valid = parseInt(value, substrateTemp);
+            else if (strcmp(token, "SUBSTRATE_TEMP_OFFSET") == 0) valid = parseInt(value, substrateOffset);
+            else if (strcmp(token, "SUBSTRATE_KP") == 0)          valid = parseDouble(value, substrateKp);
+            else if (strcmp(token, "SUBSTRATE_KD") == 0)          valid = parseDouble(value, substrateKd);
+            else if (strcmp(token, "SOURCE_TEMP") == 0)           valid = parseInt(value, sourceTemp);
+            else if (strcmp(token, "SOURCE_TEMP_OFFSET") == 0)    valid = parseInt(value, sourceOffset);
+            else if (strcmp(token, "SOURCE_KP") == 0)             valid = parseDouble(value, sourceKp);
+            else if (strcmp(token, "SOURCE_KD") == 0)             valid = parseDouble(value, sourceKd);
+            else if (strcmp(token, "DEPOSITION_TIME_MS") == 0)    valid = parseUnsigned(value, newDepositionTimeMs);
+            else {
+                Serial.print("ERR unknown parameter ");
+                Serial.print(token);
+                Serial.print("\n");
+                return;
+            }
+            if (!valid) {
+                Serial.print("ERR bad value for ");
+                Serial.print(token);
+                Serial.print("\n");
+                return;
+            }
+        }
+
+        substrateController.setParameters(substrateTemp, substrateOffset, substrateKp, substrateKd);
+        sourceController.setParameters(sourceTemp, sourceOffset, sourceKp, sourceKd);
+
+        // A running deposition keeps its start, only the end moves
+        depositionTimeMs = newDepositionTimeMs;
+        if (timerState == TimerState::STARTED) {
+            depositionEndTime = depositionStartTime + depositionTimeMs;
+        }
+
+        Serial.print("OK SET\n");
+        sendParameters();
+    }
+
+    /**
+     * @brief Whole number in int range, false if the text is empty or anything follows the digits
+     */
+    static bool parseInt(const char* text, int& result) {
+        char* end;
+        long value = strtol(text, &end, 10);
+        if (end == text || *end != '\0' || value < INT_MIN || value > INT_MAX) {
+            return false;
+        }
+        result = (int)value;
+        return true;
+    }
+
+    /**
+     * @brief Finite decimal number, false if the text is empty or anything follows it
+     */
+    static bool parseDouble(const char* text, double& result) {
+        char* end;
+        double value = strtod(text, &end);
+        if (end == text || *end != '\0' || !isfinite(value)) {
+            return false;
+        }
+        result = value;
+        return true;
+    }
+
+    /**
+     * @brief Non-negative whole number, strtoul alone would accept a sign
+     */
+    static bool parseUnsigned(const char* text, unsigned long& result) {
+        if (!isdigit(*text)) {
+            return false;
+        }
+        char* end;
+        unsigned long value = strtoul(text, &end, 10);
+        if (*end != '\0') {
+            return false;
+        }
+        result = value;
+        return true;
+    }
+
     /**
      * @brief Send full reactor data to the serial port
      */
@@ -279,11 +433,18 @@ private:
     static const size_t serialBufLen = 2048;
     char serialBuf[serialBufLen];
 
+    // Command line from the host
+    static const size_t commandBufLen = 256;
+    char commandBuf[commandBufLen];
+    size_t commandLen = 0;
+    bool commandOverflow = false;  // rest of a too long line is skipped up to its newline
+
     unsigned long relayPollTime = 0;
     unsigned long nextReadTime = 0;
     unsigned long relayCycleStart = 0;
 
     // Timer variables
+    unsigned long depositionTimeMs = DEPOSITION_TIME_MS;
     TimerState timerState = TimerState::OFF;
     unsigned long depositionStartTime = 0;
     unsigned long depositionEndTime = 0;